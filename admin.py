@@ -1,67 +1,348 @@
-from telegram import Update, ReplyKeyboardMarkup, ReplyKeyboardRemove
+from telegram import Update, ReplyKeyboardRemove, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes, ConversationHandler, MessageHandler, filters
 import logging
+import os
+from datetime import date, datetime
 from config import Config
-from database import Database
+from metrics import METRICS, timed_handler
+from database import get_database, days_ago
+from menus import ADMIN_PANEL_KEYBOARD, chunk_lines
+from reports import PdfExporter
+from maintenance import MaintenanceJob
 
 logger = logging.getLogger(__name__)
 
+# Количество клиентов на одной странице списка
+CLIENTS_PAGE_SIZE = 20
+# Количество записей, читаемых из базы за один запрос при выгрузке отчёта
+APPOINTMENTS_CHUNK_SIZE = 200
+# Поиск клиентов: сколько клиентов и последних записей каждого показывать
+SEARCH_LIMIT = 10
+SEARCH_RECENT_APPOINTMENTS = 3
+
 class AdminHandler:
     def __init__(self):
-        self.db = Database()
+        self.db = get_database()
+        self.pdf_exporter = PdfExporter(self.db.db_name)
+        self.maintenance = MaintenanceJob(
+            self.db,
+            backup_dir=Config.BACKUP_DIR,
+            interval=Config.BACKUP_INTERVAL_HOURS * 3600,
+            keep=Config.BACKUP_KEEP,
+            pages=Config.BACKUP_PAGES,
+            pause=Config.BACKUP_PAUSE,
+            archive_path=Config.ARCHIVE_DB,
+            archive_after_days=Config.ARCHIVE_AFTER_DAYS
+        )
 
+    @timed_handler
     async def admin_panel(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         if update.effective_user.id not in Config.ADMIN_IDS:
             await update.message.reply_text("У вас нет доступа к панели администратора.")
             return
 
-        keyboard = [
-            ['Список клиентов', 'Записи за 30 дней'],
-            ['В главное меню']
-        ]
-
         await update.message.reply_text(
-            "Панель администратора:",
-            reply_markup=ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
+            "Панель администратора:\n"
+            "Поиск клиента: /find <имя или начало телефона>\n"
+            "Итоги за период: /report <с> [<по>], например /report 01.09.2026 30.09.2026\n"
+            "Резервная копия: /backup",
+            reply_markup=ADMIN_PANEL_KEYBOARD
         )
 
+    @timed_handler
     async def show_clients(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         if update.effective_user.id not in Config.ADMIN_IDS:
             await update.message.reply_text("У вас нет доступа к этой функции.")
             return
 
-        clients = self.db.get_clients()
+        text, keyboard = await self._render_clients_page()
+        await update.message.reply_text(text, reply_markup=keyboard)
+
+    @timed_handler
+    async def clients_page(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Листание списка клиентов кнопками «назад/вперёд»"""
+        query = update.callback_query
+        if update.effective_user.id not in Config.ADMIN_IDS:
+            await query.answer("У вас нет доступа к этой функции.")
+            return
+
+        # callback_data: clients:<older|newer>:<id>:<created_at>
+        _, direction, client_id, created_at = query.data.split(':', 3)
+        key = (created_at, int(client_id))
+        if direction == 'older':
+            text, keyboard = await self._render_clients_page(after=key)
+        else:
+            text, keyboard = await self._render_clients_page(before=key)
+
+        await query.answer()
+        await query.edit_message_text(text, reply_markup=keyboard)
+
+    async def _render_clients_page(self, after=None, before=None):
+        clients, has_newer, has_older = await self.db.get_clients_page(
+            after=after, before=before, limit=CLIENTS_PAGE_SIZE
+        )
 
         if not clients:
-            await update.message.reply_text("Клиентов пока нет.")
+            return "Клиентов пока нет.", None
+
+        lines = ["📋 Список клиентов:\n"]
+        lines.extend(
+            f"• ID: {client['id']}, Имя: {client['name']}, Телефон: {client['phone']}, Дата: {client['created_at']}"
+            for client in clients
+        )
+
+        buttons = []
+        if has_newer:
+            first = clients[0]
+            buttons.append(InlineKeyboardButton(
+                "⬅️ Назад", callback_data=f"clients:newer:{first['id']}:{first['created_at']}"
+            ))
+        if has_older:
+            last = clients[-1]
+            buttons.append(InlineKeyboardButton(
+                "Вперёд ➡️", callback_data=f"clients:older:{last['id']}:{last['created_at']}"
+            ))
+
+        return '\n'.join(lines), InlineKeyboardMarkup([buttons]) if buttons else None
+
+    @timed_handler
+    async def search_clients(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """/find <запрос>: клиенты по имени или первым цифрам телефона с последними записями"""
+        if update.effective_user.id not in Config.ADMIN_IDS:
+            await update.message.reply_text("У вас нет доступа к этой функции.")
             return
 
-        response = "📋 Список клиентов:\n\n"
-        for client in clients:
-            response += f"• ID: {client['id']}, Имя: {client['name']}, Телефон: {client['phone']}, Дата: {client['created_at']}\n"
+        query = ' '.join(context.args or [])
+        if not query:
+            await update.message.reply_text("Укажите имя или начало телефона: /find Анна или /find 8900")
+            return
 
-        # Разбиваем на части из-за ограничения длины сообщения в Telegram
-        for i in range(0, len(response), 4000):
-            await update.message.reply_text(response[i:i+4000])
+        results = await self.db.search_clients(query, limit=SEARCH_LIMIT, recent=SEARCH_RECENT_APPOINTMENTS)
+        if not results:
+            await update.message.reply_text(f"По запросу «{query}» никого не нашлось.")
+            return
 
+        lines = [f"🔎 Результаты поиска «{query}»:\n"]
+        for client, appointments in results:
+            lines.append(
+                f"• ID: {client['id']}, Имя: {client['name']}, Телефон: {client['phone']}, Дата: {client['created_at']}"
+            )
+            lines.extend(
+                f"    – {app['created_at']}: {app['category_name']} / {app['service_name']}, {app['price']} руб."
+                + (f", время {app['starts_at'][:16]}" if app['starts_at'] else "")
+                + (", отменена" if app['status'] == 'cancelled' else "")
+                for app in appointments
+            )
+            if not appointments:
+                lines.append("    – записей нет")
+
+        for chunk in chunk_lines(lines):
+            await update.message.reply_text(chunk)
+
+    @timed_handler
     async def show_appointments(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         if update.effective_user.id not in Config.ADMIN_IDS:
             await update.message.reply_text("У вас нет доступа к этой функции.")
             return
 
-        appointments = self.db.get_appointments_last_30_days()
+        # Период — целые дни, как в daily_stats: итоги и список записей совпадают
+        since = days_ago(30)[:10]
+        # Итоги читаются из daily_stats: стоимость зависит от числа дней, а не записей
+        summary = await self.db.get_daily_stats(since, date.today().isoformat())
 
-        if not appointments:
+        if summary is None:
+            await update.message.reply_text("Произошла ошибка. Попробуйте позже.")
+            return
+
+        if not summary['total']['count']:
             await update.message.reply_text("Записей за последние 30 дней нет.")
             return
 
-        response = "📅 Записи за последние 30 дней:\n\n"
-        for app in appointments:
-            response += f"• Клиент: {app['name']}, Тел: {app['phone']}, Услуга: {app['service_name']}, Цена: {app['price']} руб., Дата: {app['created_at']}\n"
+        # Сначала итоги, затем сами записи порциями
+        for chunk in chunk_lines(self._render_summary(summary, "📊 Итоги за последние 30 дней:")):
+            await update.message.reply_text(chunk)
+
+        pending = ["📅 Записи за последние 30 дней:\n"]
+        after = None
+        while True:
+            appointments = await self.db.get_appointments_chunk(since, after=after, limit=APPOINTMENTS_CHUNK_SIZE)
+            if not appointments:
+                break
+
+            pending.extend(
+                f"• Клиент: {app['name']}, Тел: {app['phone']}, Услуга: {app['service_name']}, Цена: {app['price']} руб., Дата: {app['created_at']}"
+                + (f", Время: {app['starts_at'][:16]}" if app['starts_at'] else "")
+                + (", отменена (не входит в итоги)" if app['status'] == 'cancelled' else "")
+                for app in appointments
+            )
+
+            # Отправляем заполненные сообщения, неполное оставляем до следующей порции
+            chunks = list(chunk_lines(pending))
+            for chunk in chunks[:-1]:
+                await update.message.reply_text(chunk)
+            pending = chunks[-1:]
+
+            last = appointments[-1]
+            after = (last['created_at'], last['id'])
+
+        for chunk in pending:
+            await update.message.reply_text(chunk)
+
+    def _render_summary(self, summary, title):
+        total = summary['total']
+        lines = [
+            title,
+            f"Записей: {total['count']}, выручка: {total['revenue']} руб.\n"
+        ]
+        if summary.get('by_category'):
+            lines.append("По категориям:")
+            lines.extend(
+                f"• {row['category_name']}: {row['count']} шт., {row['revenue']} руб."
+                for row in summary['by_category']
+            )
+            lines.append("")
+        lines.append("По услугам:")
+        lines.extend(
+            f"• {row['category_name']} / {row['service_name']}: {row['count']} шт., {row['revenue']} руб."
+            for row in summary['by_service']
+        )
+        lines.append("\nПо дням:")
+        lines.extend(
+            f"• {row['day']}: {row['count']} шт., {row['revenue']} руб."
+            for row in summary['by_day']
+        )
+        return lines
+
+    @timed_handler
+    async def show_report(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """/report <с> [<по>]: итоги за произвольный период по daily_stats"""
+        if update.effective_user.id not in Config.ADMIN_IDS:
+            await update.message.reply_text("У вас нет доступа к этой функции.")
+            return
+
+        args = context.args or []
+        dates = [self._parse_date(arg) for arg in args[:2]]
+        if not dates or None in dates:
+            await update.message.reply_text(
+                "Укажите период: /report 01.09.2026 30.09.2026 или одну дату для одного дня."
+            )
+            return
+
+        date_from, date_to = dates[0], dates[-1]
+        if date_from > date_to:
+            date_from, date_to = date_to, date_from
+
+        summary = await self.db.get_daily_stats(date_from.isoformat(), date_to.isoformat())
+        if summary is None:
+            await update.message.reply_text("Произошла ошибка. Попробуйте позже.")
+            return
+
+        period = f"{date_from:%d.%m.%Y}" if date_from == date_to else f"{date_from:%d.%m.%Y} — {date_to:%d.%m.%Y}"
+        if not summary['total']['count']:
+            await update.message.reply_text(f"Записей за {period} нет.")
+            return
+
+        for chunk in chunk_lines(self._render_summary(summary, f"📊 Итоги за {period}:")):
+            await update.message.reply_text(chunk)
+
+    @staticmethod
+    def _parse_date(text):
+        for fmt in ('%d.%m.%Y', '%Y-%m-%d', '%d.%m.%y'):
+            try:
+                return datetime.strptime(text, fmt).date()
+            except ValueError:
+                continue
+        return None
+
+    @timed_handler
+    async def rebuild_stats(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """/rebuild_stats: пересчёт daily_stats по всем записям"""
+        if update.effective_user.id not in Config.ADMIN_IDS:
+            await update.message.reply_text("У вас нет доступа к этой функции.")
+            return
+
+        await update.message.reply_text("Пересчитываю статистику...")
+        if await self.db.rebuild_daily_stats():
+            await update.message.reply_text("Статистика пересчитана.")
+        else:
+            await update.message.reply_text("Произошла ошибка. Попробуйте позже.")
+
+    @timed_handler
+    async def run_backup(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """/backup: резервная копия базы сейчас (и архивация, если включена)"""
+        if update.effective_user.id not in Config.ADMIN_IDS:
+            await update.message.reply_text("У вас нет доступа к этой функции.")
+            return
+
+        await update.message.reply_text("Создаю резервную копию...")
+        try:
+            paths = await self.maintenance.run()
+        except Exception as e:
+            logger.error(f"Ошибка резервного копирования: {e}")
+            await update.message.reply_text("Произошла ошибка. Попробуйте позже.")
+            return
+
+        await update.message.reply_text("Готово:\n" + '\n'.join(f"• {path}" for path in paths))
+
+    @timed_handler
+    async def export_clients_pdf(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        if update.effective_user.id not in Config.ADMIN_IDS:
+            await update.message.reply_text("У вас нет доступа к этой функции.")
+            return
+
+        await update.message.reply_text("Готовлю PDF со списком клиентов...")
+        await self._send_pdf(update, self.pdf_exporter.export_clients(), 'clients.pdf')
+
+    @timed_handler
+    async def export_appointments_pdf(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        if update.effective_user.id not in Config.ADMIN_IDS:
+            await update.message.reply_text("У вас нет доступа к этой функции.")
+            return
+
+        await update.message.reply_text("Готовлю PDF с записями за 30 дней...")
+        await self._send_pdf(update, self.pdf_exporter.export_appointments(days_ago(30)[:10]), 'appointments.pdf')
+
+    async def _send_pdf(self, update, export, filename):
+        try:
+            path = await export
+        except Exception as e:
+            logger.error(f"Ошибка при формировании PDF: {e}")
+            await update.message.reply_text("Произошла ошибка. Попробуйте позже.")
+            return
+
+        try:
+            with open(path, 'rb') as document:
+                await update.message.reply_document(document=document, filename=filename)
+        finally:
+            os.remove(path)
+
+    @timed_handler
+    async def show_stats(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        if update.effective_user.id not in Config.ADMIN_IDS:
+            await update.message.reply_text("У вас нет доступа к этой функции.")
+            return
+
+        lines = ["📈 Статистика бота\n", "Обработчики (вызовов, p50, p95):"]
+        for label, histogram in sorted(METRICS.histograms('bot_handler_seconds').items()):
+            lines.append(
+                f"• {label}: {histogram.count}, "
+                f"{histogram.quantile(0.5) * 1000:g} мс, {histogram.quantile(0.95) * 1000:g} мс"
+            )
+
+        rows = METRICS.counters('bot_db_rows_total')
+        lines.append("\nЗапросы к БД (вызовов, p95, строк):")
+        for label, histogram in sorted(METRICS.histograms('bot_db_query_seconds').items()):
+            lines.append(
+                f"• {label}: {histogram.count}, "
+                f"{histogram.quantile(0.95) * 1000:g} мс, {rows.get(label, 0)}"
+            )
+
+        lines.append("\nПоказатели:")
+        lines.extend(f"• {name}: {value}" for name, value in sorted(METRICS.gauges().items()))
 
-        # Разбиваем на части
-        for i in range(0, len(response), 4000):
-            await update.message.reply_text(response[i:i+4000])
+        for chunk in chunk_lines(lines):
+            await update.message.reply_text(chunk)
 
+    @timed_handler
     async def back_to_admin(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         await self.admin_panel(update, context)
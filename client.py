@@ -1,20 +1,43 @@
-from telegram import Update, ReplyKeyboardMarkup, ReplyKeyboardRemove
+from telegram import Update, ReplyKeyboardRemove
 from telegram.ext import ContextTypes, ConversationHandler, MessageHandler, filters
 import logging
 import re
 from config import Config
-from database import Database
+from metrics import timed_handler
+from database import get_database, BookingQueue
+from sessions import SessionStore
+from notifications import AdminNotifier
+from menus import MenuRenderer, slot_keyboard, ADMIN_START_KEYBOARD, RESTART_KEYBOARD, WELCOME_TEXT
+from phones import normalize_phone
+from scheduling import Scheduler, SlotTakenError, format_slot, TIMESTAMP_FORMAT
+from datetime import datetime
 
 logger = logging.getLogger(__name__)
 
-# Состояния для ConversationHandler
-PHONE, NAME = range(2)
+# Состояния для ConversationHandler (номера сохраняются в базе, новые — в конец)
+PHONE, NAME, SLOT = range(3)
 
 class ClientHandler:
     def __init__(self):
-        self.db = Database()
-        self.user_states = {}  # Для отслеживания состояний пользователей
+        self.db = get_database()
+        self.menus = MenuRenderer(self.db.catalog)
+        self.booking_queue = BookingQueue(self.db) if Config.BOOKING_QUEUE else None
+        self.notifier = AdminNotifier(Config.ADMIN_IDS)
+        self.scheduler = Scheduler(
+            self.db.slots,
+            work_start=Config.WORK_START,
+            work_end=Config.WORK_END,
+            work_days=Config.WORK_DAYS,
+            step=Config.SLOT_STEP,
+            days_ahead=Config.BOOKING_DAYS_AHEAD,
+            lead=Config.BOOKING_LEAD_MINUTES
+        )
+        # Состояния пользователей: открытая категория меню (после перезапуска — из user_data)
+        self.user_states = SessionStore(max_entries=Config.SESSION_MAX_ENTRIES, ttl=Config.SESSION_TTL)
+        # Пользователи, находящиеся в диалоге записи (для метрик)
+        self.active_bookings = SessionStore(max_entries=Config.SESSION_MAX_ENTRIES, ttl=Config.SESSION_TTL)
 
+    @timed_handler
     async def start(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         try:
             user_id = update.effective_user.id
@@ -23,112 +46,146 @@ class ClientHandler:
             if user_id in Config.ADMIN_IDS:
                 await update.message.reply_text(
                     "Добро пожаловать в панель администратора!",
-                    reply_markup=ReplyKeyboardMarkup([['/admin']], resize_keyboard=True)
+                    reply_markup=ADMIN_START_KEYBOARD
                 )
                 return
 
             # Обычный пользователь
-            welcome_text = "Рады Вас видеть в нашей студии маникюра \"Ноготочки-Точка\"!"
-            keyboard = [
-                ['Маникюр', 'Педикюр', 'Наращивание'],
-                ['Перейти в телеграм-канал', 'Перейти на сайт'],
-                ['Адрес студии']
-            ]
-
             await update.message.reply_text(
-                welcome_text,
-                reply_markup=ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
+                WELCOME_TEXT,
+                reply_markup=self.menus.start_keyboard
             )
 
         except Exception as e:
             logger.error(f"Ошибка в start: {e}")
             await update.message.reply_text("Произошла ошибка. Попробуйте позже.")
 
+    @timed_handler
     async def show_services(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         try:
             category_name = update.message.text
-            categories = self.db.get_categories()
-
-            # Находим ID категории по имени
-            category_id = None
-            for cat_id, cat_name in categories:
-                if cat_name == category_name:
-                    category_id = cat_id
-                    break
+            # Меню категории строится из кэша каталога один раз на его версию
+            menu = self.menus.get_category_menu(category_name)
 
-            if not category_id:
+            if not menu:
                 await update.message.reply_text("Категория не найдена.")
                 return
 
-            services = self.db.get_services_by_category(category_id)
-
-            if not services:
+            if not menu.keyboard:
                 await update.message.reply_text("В этой категории пока нет услуг.")
                 return
 
-            keyboard = []
-            service_map = {}  # Для хранения соответствия текста кнопки и ID услуги
-
-            for service in services:
-                service_id, name, price, duration = service
-                button_text = f"{name} - {price} руб. ({duration})"
-                keyboard.append([button_text])
-                service_map[button_text] = service_id
-
-            keyboard.append(['Назад'])
-
-            # Сохраняем mapping для этого пользователя
+            # Кнопки услуг распознаются в меню открытой категории
             user_id = update.effective_user.id
-            self.user_states[user_id] = {'service_map': service_map}
-
-            text = f"Услуги в категории '{category_name}':\n\n"
-            for service in services:
-                service_id, name, price, duration = service
-                text += f"• {name} - {price} руб., {duration}\n"
+            self.user_states.set(user_id, category_name)
+            # Категория сохраняется в user_data и переживает перезапуск бота
+            context.user_data['category'] = category_name
 
             await update.message.reply_text(
-                text,
-                reply_markup=ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
+                menu.text,
+                reply_markup=menu.keyboard
             )
 
         except Exception as e:
             logger.error(f"Ошибка в show_services: {e}")
             await update.message.reply_text("Произошла ошибка. Попробуйте позже.")
 
+    @timed_handler
     async def start_appointment(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         try:
             user_id = update.effective_user.id
             button_text = update.message.text
 
-            # Проверяем, есть ли mapping для этого пользователя
-            if user_id not in self.user_states or 'service_map' not in self.user_states[user_id]:
+            # Кнопка услуги ищется по точному тексту в меню открытой категории
+            # текущей версии каталога, а если категория неизвестна — во всех
+            category_name = self.user_states.get(user_id) or context.user_data.get('category')
+            service_id = self.menus.get_service_id(button_text, category_name)
+            if service_id is None:
                 await update.message.reply_text("Пожалуйста, выберите услугу из меню.")
                 return ConversationHandler.END
 
-            service_map = self.user_states[user_id]['service_map']
-
-            if button_text in service_map:
-                service_id = service_map[button_text]
-                context.user_data['service_id'] = service_id
-
-                await update.message.reply_text(
-                    "Для записи на прием введите ваш номер телефона:",
-                    reply_markup=ReplyKeyboardRemove()
+            context.user_data['service_id'] = service_id
+            context.user_data.pop('name', None)
+            self.active_bookings.set(user_id, True)
+
+            # Постоянный клиент: имя и телефон уже известны, шаги PHONE/NAME пропускаются
+            client = await self.db.get_client_by_user(user_id)
+            if client:
+                context.user_data['name'] = client['name']
+                context.user_data['phone'] = client['phone']
+                return await self._offer_slots(
+                    update, context,
+                    f"С возвращением, {client['name']}! Запишем на номер {client['phone']}.\n"
+                    f"Выберите удобное время (для отмены — /cancel):"
                 )
 
-                return PHONE
-            else:
-                await update.message.reply_text("Пожалуйста, выберите услугу из меню.")
-                return ConversationHandler.END
+            return await self._offer_slots(update, context, "Выберите удобное время:")
 
         except Exception as e:
             logger.error(f"Ошибка в start_appointment: {e}")
             await update.message.reply_text("Произошла ошибка. Попробуйте позже.")
             return ConversationHandler.END
 
+    async def _offer_slots(self, update, context, text):
+        # Свободное время ищется в индексе занятости в памяти, без запросов к базе
+        minutes = self.db.catalog.get_duration(context.user_data['service_id'])
+        slots = self.scheduler.find_slots(minutes, limit=Config.SLOTS_OFFERED)
+        if not slots:
+            self.active_bookings.pop(update.effective_user.id)
+            await update.message.reply_text(
+                "К сожалению, свободного времени на ближайшие дни нет. Попробуйте позже.",
+                reply_markup=RESTART_KEYBOARD
+            )
+            return ConversationHandler.END
+
+        offered = {format_slot(start): [master_id, start.strftime(TIMESTAMP_FORMAT)] for start, master_id in slots}
+        context.user_data['slots'] = offered
+        await update.message.reply_text(text, reply_markup=slot_keyboard(list(offered)))
+        return SLOT
+
+    @timed_handler
+    async def choose_slot(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        try:
+            slot = context.user_data.get('slots', {}).get(update.message.text)
+            if not slot:
+                await update.message.reply_text("Пожалуйста, выберите время из списка.")
+                return SLOT
+
+            # Слоты хранятся в user_data и переживают перезапуск: время могло пройти
+            if not self.scheduler.is_bookable(datetime.strptime(slot[1], TIMESTAMP_FORMAT)):
+                return await self._offer_slots(update, context, "Это время уже недоступно. Выберите другое:")
+
+            context.user_data['slot'] = slot
+            if 'name' in context.user_data:
+                # Повторный выбор после того, как прежнее время заняли: данные уже есть
+                return await self._finish_booking(update, context)
+
+            await update.message.reply_text(
+                "Для записи на прием введите ваш номер телефона:",
+                reply_markup=ReplyKeyboardRemove()
+            )
+            return PHONE
+
+        except Exception as e:
+            logger.error(f"Ошибка в choose_slot: {e}")
+            await update.message.reply_text("Произошла ошибка. Попробуйте позже.")
+            return ConversationHandler.END
+
+    @timed_handler
+    async def back_from_slots(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        self._clear_booking(update.effective_user.id, context)
+        await self.back_to_start(update, context)
+        return ConversationHandler.END
+
+    @timed_handler
     async def get_phone(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         try:
-            phone = update.message.text
+            phone = normalize_phone(update.message.text)
+            if not phone:
+                await update.message.reply_text(
+                    "Не удалось распознать номер. Введите номер телефона, например +7 900 123-45-67:"
+                )
+                return PHONE
             context.user_data['phone'] = phone
 
             await update.message.reply_text("Теперь введите ваше имя:")
@@ -140,18 +197,41 @@ class ClientHandler:
             await update.message.reply_text("Произошла ошибка. Попробуйте позже.")
             return ConversationHandler.END
 
+    @timed_handler
     async def get_name(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        context.user_data['name'] = update.message.text
+        return await self._finish_booking(update, context)
+
+    async def _finish_booking(self, update, context):
         try:
-            name = update.message.text
+            name = context.user_data['name']
             phone = context.user_data['phone']
             service_id = context.user_data['service_id']
+            master_id, starts_at = context.user_data['slot']
+            slot = (master_id, datetime.strptime(starts_at, TIMESTAMP_FORMAT))
+            if not self.scheduler.is_bookable(slot[1]):
+                # Пока вводились телефон и имя, выбранное время прошло
+                return await self._offer_slots(update, context, "Это время уже недоступно. Выберите другое:")
 
-            # Сохраняем клиента и запись
-            client_id = self.db.add_client(name, phone)
-            appointment_id = self.db.add_appointment(client_id, service_id)
+            # Сохраняем клиента и запись одной транзакцией; занятое время отклоняется
+            user_id = update.effective_user.id
+            try:
+                if self.booking_queue:
+                    booking = await self.booking_queue.book(name, phone, service_id, slot, user_id)
+                else:
+                    booking = await self.db.book(name, phone, service_id, slot, user_id)
+            except SlotTakenError:
+                return await self._offer_slots(
+                    update, context, "К сожалению, это время только что заняли. Выберите другое:"
+                )
+
+            if not booking:
+                await update.message.reply_text("Произошла ошибка при записи. Попробуйте позже.")
+                return ConversationHandler.END
 
-            # Получаем информацию об услуге
-            service_info = self.db.get_service(service_id)
+            client_id, appointment_id, service_info = booking
+            when = format_slot(slot[1])
+            master_name = dict(self.db.slots.masters).get(master_id, '')
 
             if service_info:
                 service_name, price, duration, category_name = service_info[1], service_info[2], service_info[3], service_info[4]
@@ -163,12 +243,13 @@ class ClientHandler:
                     f"• Имя: {name}\n"
                     f"• Телефон: {phone}\n"
                     f"• Услуга: {service_name}\n"
-                    f"• Стоимость: {price} руб.\n\n"
-                    f"Мы свяжемся с вами в ближайшее время для подтверждения.",
-                    reply_markup=ReplyKeyboardMarkup([['/start']], resize_keyboard=True)
+                    f"• Стоимость: {price} руб.\n"
+                    f"• Время: {when}\n\n"
+                    f"Ждём вас!",
+                    reply_markup=RESTART_KEYBOARD
                 )
 
-                # Логируем для администратора
+                # Логируем и отправляем администраторам в фоне
                 admin_message = (
                     f"🎉 Новая запись! 🎉\n"
                     f"Клиент № {client_id}:\n"
@@ -177,15 +258,15 @@ class ClientHandler:
                     f"Категория услуг - {category_name}\n"
                     f"Услуга - {service_name}\n"
                     f"Стоимость - {price} руб.\n"
-                    f"Время оказания услуги - {duration}\n\n"
-                    f"Свяжитесь с клиентом для согласования дня и времени!"
+                    f"Время оказания услуги - {duration}\n"
+                    f"Дата и время - {when}\n"
+                    f"Мастер - {master_name}"
                 )
                 logger.info(admin_message)
+                self.notifier.notify_admins(admin_message)
 
             # Очищаем состояние пользователя
-            user_id = update.effective_user.id
-            if user_id in self.user_states:
-                del self.user_states[user_id]
+            self._clear_booking(user_id, context)
 
             return ConversationHandler.END
 
@@ -194,38 +275,56 @@ class ClientHandler:
             await update.message.reply_text("Произошла ошибка при записи. Попробуйте позже.")
             return ConversationHandler.END
 
+    def _clear_booking(self, user_id, context):
+        self.user_states.pop(user_id)
+        self.active_bookings.pop(user_id)
+        for key in ('category', 'name', 'slot', 'slots'):
+            context.user_data.pop(key, None)
+
+    @timed_handler
     async def cancel(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         # Очищаем состояние пользователя
-        user_id = update.effective_user.id
-        if user_id in self.user_states:
-            del self.user_states[user_id]
+        self._clear_booking(update.effective_user.id, context)
 
         await update.message.reply_text(
             "Запись отменена.",
-            reply_markup=ReplyKeyboardMarkup([['/start']], resize_keyboard=True)
+            reply_markup=RESTART_KEYBOARD
         )
         return ConversationHandler.END
 
+    @timed_handler
+    async def restart(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """/start посреди записи: диалог прерывается, показывается главное меню"""
+        self._clear_booking(update.effective_user.id, context)
+
+        await self.start(update, context)
+        return ConversationHandler.END
+
+    @timed_handler
     async def show_telegram_channel(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text(f"📢 Наш телеграм-канал: {Config.TELEGRAM_CHANNEL}")
 
+    @timed_handler
     async def show_website(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text(f"🌐 Наш сайт: {Config.WEBSITE_URL}")
 
+    @timed_handler
     async def show_address(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text(f"📍 Наш адрес: {Config.MAP_COORDINATES}")
 
+    @timed_handler
     async def back_to_start(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         # Очищаем состояние пользователя
         user_id = update.effective_user.id
-        if user_id in self.user_states:
-            del self.user_states[user_id]
+        self.user_states.pop(user_id)
+        context.user_data.pop('category', None)
 
         await self.start(update, context)
 
+    @timed_handler
     async def handle_unknown(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Обработчик для неизвестных сообщений"""
         await update.message.reply_text(
             "Пожалуйста, используйте кнопки меню для навигации.",
-            reply_markup=ReplyKeyboardMarkup([['/start']], resize_keyboard=True)
+            reply_markup=RESTART_KEYBOARD
         )
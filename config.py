@@ -2,11 +2,6 @@ import os
 from dotenv import load_dotenv
 import logging
 
-# Настройка логирования
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO
-)
 logger = logging.getLogger(__name__)
 
 # Загрузка переменных окружения
@@ -28,6 +23,68 @@ class Config:
     TELEGRAM_CHANNEL = os.getenv('TELEGRAM_CHANNEL', '')
     MAP_COORDINATES = os.getenv('MAP_COORDINATES', '')
 
+    # Расписание: рабочие часы, рабочие дни (0 — понедельник), шаг сетки слотов (мин.),
+    # горизонт записи (дней), минимальный запас до начала (мин.) и число предлагаемых слотов
+    WORK_START = os.getenv('WORK_START', '10:00')
+    WORK_END = os.getenv('WORK_END', '20:00')
+    WORK_DAYS = [int(day) for day in os.getenv('WORK_DAYS', '0,1,2,3,4,5').split(',') if day.strip()]
+    SLOT_STEP = int(os.getenv('SLOT_STEP', '30'))
+    BOOKING_DAYS_AHEAD = int(os.getenv('BOOKING_DAYS_AHEAD', '14'))
+    BOOKING_LEAD_MINUTES = int(os.getenv('BOOKING_LEAD_MINUTES', '60'))
+    SLOTS_OFFERED = int(os.getenv('SLOTS_OFFERED', '12'))
+
+    # Групповой коммит записей (для пиковых нагрузок)
+    BOOKING_QUEUE = os.getenv('BOOKING_QUEUE', '0') == '1'
+
+    # Хранилище состояний пользователей: лимит записей и время жизни (сек.)
+    SESSION_MAX_ENTRIES = int(os.getenv('SESSION_MAX_ENTRIES', '10000'))
+    SESSION_TTL = int(os.getenv('SESSION_TTL', '3600'))
+
+    # Ограничение частоты сообщений от пользователя: токенов в секунду (0 — отключено),
+    # размер пачки и число отслеживаемых пользователей
+    THROTTLE_RATE = float(os.getenv('THROTTLE_RATE', '1'))
+    THROTTLE_BURST = int(os.getenv('THROTTLE_BURST', '5'))
+    THROTTLE_MAX_USERS = int(os.getenv('THROTTLE_MAX_USERS', '10000'))
+
+    # Интервал сохранения состояния диалогов в базу (сек.)
+    PERSISTENCE_INTERVAL = float(os.getenv('PERSISTENCE_INTERVAL', '5'))
+
+    # Параллельная обработка обновлений (порядок внутри чата сохраняется)
+    CONCURRENT_UPDATES = int(os.getenv('CONCURRENT_UPDATES', '64'))
+
+    # Режим webhook: включается, если задан WEBHOOK_URL, иначе polling
+    WEBHOOK_URL = os.getenv('WEBHOOK_URL', '')
+    WEBHOOK_LISTEN = os.getenv('WEBHOOK_LISTEN', '0.0.0.0')
+    WEBHOOK_PORT = int(os.getenv('WEBHOOK_PORT', '8443'))
+    WEBHOOK_PATH = os.getenv('WEBHOOK_PATH', 'telegram')
+    WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET', '') or None
+    # Сертификат и ключ для HTTPS; без них слушаем HTTP (TLS на прокси)
+    WEBHOOK_CERT = os.getenv('WEBHOOK_CERT', '') or None
+    WEBHOOK_KEY = os.getenv('WEBHOOK_KEY', '') or None
+
+    # Логирование: файл с ротацией по размеру, опционально в формате JSON
+    LOG_FILE = os.getenv('LOG_FILE', 'bot.log')
+    LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+    LOG_MAX_BYTES = int(os.getenv('LOG_MAX_BYTES', str(10 * 1024 * 1024)))
+    LOG_BACKUP_COUNT = int(os.getenv('LOG_BACKUP_COUNT', '5'))
+    LOG_JSON = os.getenv('LOG_JSON', '0') == '1'
+
+    # Резервные копии: каталог, интервал (ч., 0 — отключены), сколько хранить,
+    # страниц за шаг online backup и пауза между шагами (сек.)
+    BACKUP_DIR = os.getenv('BACKUP_DIR', 'backups')
+    BACKUP_INTERVAL_HOURS = float(os.getenv('BACKUP_INTERVAL_HOURS', '24'))
+    BACKUP_KEEP = int(os.getenv('BACKUP_KEEP', '7'))
+    BACKUP_PAGES = int(os.getenv('BACKUP_PAGES', '256'))
+    BACKUP_PAUSE = float(os.getenv('BACKUP_PAUSE', '0.01'))
+
+    # Архив: записи старше ARCHIVE_AFTER_DAYS дней переносятся в ARCHIVE_DB (0 — отключено)
+    ARCHIVE_DB = os.getenv('ARCHIVE_DB', 'beauty_bot_archive.db')
+    ARCHIVE_AFTER_DAYS = int(os.getenv('ARCHIVE_AFTER_DAYS', '0'))
+
+    # Локальный эндпоинт метрик в формате Prometheus (0 — отключён)
+    METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')
+    METRICS_PORT = int(os.getenv('METRICS_PORT', '9108'))
+
     # Проверка загрузки переменных
     @classmethod
     def check_config(cls):
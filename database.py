@@ -1,26 +1,248 @@
 import sqlite3
+import asyncio
+import functools
+import json
 import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from collections import namedtuple
+from contextlib import contextmanager
 from datetime import datetime, timedelta
+from metrics import record_query
+from phones import normalize_phone, phone_prefix
+from scheduling import (
+    SlotIndex, SlotTakenError, parse_duration, DEFAULT_DURATION_MINUTES, TIMESTAMP_FORMAT
+)
 
 logger = logging.getLogger(__name__)
 
-class Database:
-    def __init__(self, db_name='beauty_bot.db'):
+
+def days_ago(days):
+    # Граница периода в формате колонок created_at
+    return (datetime.now() - timedelta(days=days)).strftime(TIMESTAMP_FORMAT)
+
+def backup_database(source, path, pages=256, pause=0.01, lock=None):
+    """Горячая копия базы через SQLite online backup API из соединения source.
+
+    Копирование идёт шагами по pages страниц с паузой pause секунд между
+    ними. lock — блокировка, под которой source используется для записи:
+    она удерживается только на время шага, и запись продолжается между
+    шагами через то же соединение, а SQLite сразу переносит её в копию.
+    Копия пишется во временный файл и переименовывается по готовности.
+    Возвращает размер копии в байтах.
+    """
+    tmp_path = path + '.tmp'
+
+    def progress(status, remaining, total):
+        if lock:
+            lock.release()
+        time.sleep(pause)
+        if lock:
+            lock.acquire()
+
+    target = sqlite3.connect(tmp_path)
+    try:
+        if lock:
+            lock.acquire()
+        try:
+            source.backup(target, pages=pages, progress=progress)
+        finally:
+            if lock:
+                lock.release()
+    finally:
+        target.close()
+    os.replace(tmp_path, path)
+    return os.path.getsize(path)
+
+
+class ConnectionPool:
+    """Долгоживущие соединения с SQLite: одно для записи и несколько для чтения.
+
+    Все соединения работают в режиме WAL, поэтому читатели не блокируются
+    писателем, а запись сериализуется блокировкой единственного writer.
+    """
+
+    def __init__(self, db_name, readers=4, cache_size_kb=8192, cached_statements=256):
         self.db_name = db_name
-        self.init_db()
+        self.cache_size_kb = cache_size_kb
+        self.cached_statements = cached_statements
+        self._write_lock = threading.Lock()
+        self._writer = self._connect()
+        self._readers = queue.Queue()
+        for _ in range(readers):
+            self._readers.put(self._connect())
 
-    def get_connection(self):
+    def _connect(self):
         try:
-            conn = sqlite3.connect(self.db_name)
+            conn = sqlite3.connect(
+                self.db_name,
+                check_same_thread=False,
+                cached_statements=self.cached_statements
+            )
             conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute(f'PRAGMA cache_size=-{self.cache_size_kb}')
+            conn.execute('PRAGMA busy_timeout=5000')
             return conn
         except sqlite3.Error as e:
             logger.error(f"Database connection error: {e}")
             raise
 
+    @contextmanager
+    def write(self):
+        with self._write_lock:
+            try:
+                yield self._writer
+                self._writer.commit()
+            except Exception:
+                self._writer.rollback()
+                raise
+
+    @contextmanager
+    def read(self):
+        conn = self._readers.get()
+        try:
+            yield conn
+        finally:
+            self._readers.put(conn)
+
+    def backup(self, path, pages=256, pause=0.01):
+        # Копия снимается через writer: его изменения попадают в неё без перезапуска копирования
+        return backup_database(self._writer, path, pages=pages, pause=pause, lock=self._write_lock)
+
+    def close(self):
+        with self._write_lock:
+            self._writer.close()
+        while not self._readers.empty():
+            self._readers.get_nowait().close()
+
+
+CatalogSnapshot = namedtuple(
+    'CatalogSnapshot',
+    ['version', 'categories', 'category_ids', 'category_names', 'services_by_category', 'services_by_id',
+     'durations']
+)
+
+
+class CatalogCache:
+    """Кэш каталога категорий и услуг в памяти процесса.
+
+    Каталог меняется редко, поэтому он целиком загружается при старте и
+    перезагружается после add_service/update_service/delete_service.
+    Снимок заменяется атомарно, чтение не требует блокировок.
+    """
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0  # Обращения по ключу, которого нет в каталоге
+        self.loads = 0  # Загрузки каталога (при старте и после изменений)
+        self._snapshot = None
+
+    @property
+    def version(self):
+        return self._snapshot.version if self._snapshot else 0
+
+    def load(self, conn):
+        cursor = conn.cursor()
+        cursor.execute('SELECT id, name FROM categories ORDER BY id')
+        categories = [(row['id'], row['name']) for row in cursor.fetchall()]
+        category_names = dict(categories)
+
+        services_by_category = {category_id: [] for category_id, _ in categories}
+        services_by_id = {}
+        durations = {}  # ID услуги -> длительность в минутах
+        cursor.execute('SELECT id, category_id, name, price, duration FROM services ORDER BY id')
+        for row in cursor.fetchall():
+            service = (row['id'], row['name'], row['price'], row['duration'])
+            services_by_category.setdefault(row['category_id'], []).append(service)
+            services_by_id[row['id']] = service + (category_names.get(row['category_id']),)
+            durations[row['id']] = parse_duration(row['duration'])
+            if durations[row['id']] is None:
+                logger.warning(f"Не удалось разобрать длительность услуги {row['id']}: {row['duration']!r}")
+                durations[row['id']] = DEFAULT_DURATION_MINUTES
+
+        self._snapshot = CatalogSnapshot(
+            version=self.version + 1,
+            categories=tuple(categories),
+            category_ids={name: category_id for category_id, name in categories},
+            category_names=category_names,
+            services_by_category={k: tuple(v) for k, v in services_by_category.items()},
+            services_by_id=services_by_id,
+            durations=durations
+        )
+        self.loads += 1
+
+    def _get(self):
+        self.hits += 1
+        return self._snapshot
+
+    def _lookup(self, table, key, default=None):
+        value = getattr(self._snapshot, table).get(key)
+        if value is None:
+            self.misses += 1
+            return default
+        self.hits += 1
+        return value
+
+    def get_categories(self):
+        return list(self._get().categories)
+
+    def get_category_id(self, category_name):
+        return self._lookup('category_ids', category_name)
+
+    def get_category_name(self, category_id):
+        return self._lookup('category_names', category_id)
+
+    def get_services(self, category_id):
+        return list(self._lookup('services_by_category', category_id, ()))
+
+    def get_service(self, service_id):
+        return self._lookup('services_by_id', service_id)
+
+    def get_duration(self, service_id):
+        return self._lookup('durations', service_id, DEFAULT_DURATION_MINUTES)
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'loads': self.loads, 'version': self.version}
+
+
+# UPSERT появился в SQLite 3.24, оконные функции — в 3.25
+MIN_SQLITE_VERSION = (3, 25, 0)
+
+
+class Database:
+    def __init__(self, db_name='beauty_bot.db', readers=4):
+        if sqlite3.sqlite_version_info < MIN_SQLITE_VERSION:
+            raise RuntimeError(
+                f"SQLite {sqlite3.sqlite_version} is too old, "
+                f"{'.'.join(map(str, MIN_SQLITE_VERSION))}+ is required"
+            )
+        self.db_name = db_name
+        self.pool = ConnectionPool(db_name, readers=readers)
+        self.catalog = CatalogCache()
+        self.slots = SlotIndex()
+        # Самая длинная запись в минутах: нижняя граница поиска пересечений
+        self._longest_booking = DEFAULT_DURATION_MINUTES
+        self.init_db()
+        self.load_catalog()
+        self.load_schedule()
+
+    def read(self):
+        return self.pool.read()
+
+    def write(self):
+        return self.pool.write()
+
+    def close(self):
+        self.pool.close()
+
     def init_db(self):
         try:
-            with self.get_connection() as conn:
+            with self.write() as conn:
                 cursor = conn.cursor()
 
                 # Таблица категорий
@@ -66,16 +288,286 @@ class Database:
                     )
                 ''')
 
-                # Добавляем начальные данные
-                self._add_initial_data(cursor)
+                # Применяем миграции схемы и начальные данные (один раз)
+                self._migrate(conn)
 
-                conn.commit()
                 logger.info("База данных инициализирована успешно")
 
         except Exception as e:
             logger.error(f"Error initializing database: {e}")
             raise
 
+    def _migrations(self):
+        # Версии схемы по порядку; текущая хранится в PRAGMA user_version
+        return [
+            (1, self._migration_indexes),
+            (2, self._migration_unique_services),
+            (3, self._add_initial_data),
+            (4, self._migration_bot_state),
+            (5, self._migration_schedule),
+            (6, self._migration_normalize_phones),
+            (7, self._migration_client_search),
+            (8, self._migration_daily_stats),
+            (9, self._migration_archive),
+            (10, self._migration_booking_price),
+        ]
+
+    def _migrate(self, conn):
+        cursor = conn.cursor()
+        cursor.execute('PRAGMA user_version')
+        current_version = cursor.fetchone()[0]
+
+        for version, migration in self._migrations():
+            if version <= current_version:
+                continue
+            # Явный BEGIN: без него sqlite3 сразу фиксирует DDL (ALTER/CREATE),
+            # и упавшая миграция оставила бы схему изменённой без смены версии
+            if conn.in_transaction:
+                conn.commit()
+            cursor.execute('BEGIN')
+            try:
+                migration(cursor)
+                cursor.execute(f'PRAGMA user_version = {version}')
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            logger.info(f"Database migrated to version {version}")
+
+    def _merge_duplicate_clients(self, cursor, key=None):
+        """Сливает клиентов с одинаковым телефоном (после key, если задан).
+
+        Остаётся самый ранний клиент, имя берётся самое последнее непустое,
+        записи дублей переносятся на оставшегося. Возвращает число удалённых.
+        """
+        cursor.execute('SELECT id, name, phone FROM clients ORDER BY id')
+        groups = {}
+        for row in cursor.fetchall():
+            phone = key(row['phone']) if key else row['phone']
+            groups.setdefault(phone, []).append((row['id'], row['name'], row['phone']))
+
+        merged = 0
+        for phone, clients in groups.items():
+            keep_id, keep_name, keep_phone = clients[0]
+            name = next((name for _, name, _ in reversed(clients) if name and name.strip()), keep_name)
+            duplicates = [(keep_id, client_id) for client_id, _, _ in clients[1:]]
+            if duplicates:
+                cursor.executemany('UPDATE appointments SET client_id = ? WHERE client_id = ?', duplicates)
+                cursor.executemany('DELETE FROM clients WHERE id = ?', [(client_id,) for _, client_id in duplicates])
+                merged += len(duplicates)
+            if (phone, name) != (keep_phone, keep_name):
+                cursor.execute('UPDATE clients SET phone = ?, name = ? WHERE id = ?', (phone, name, keep_id))
+        return merged
+
+    def _migration_indexes(self, cursor):
+        # Сливаем клиентов с одинаковым телефоном перед уникальным индексом
+        self._merge_duplicate_clients(cursor)
+
+        cursor.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_clients_phone ON clients (phone)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_clients_created_at ON clients (created_at, id)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_appointments_created_at ON appointments (created_at)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_services_category_id ON services (category_id)')
+
+    def _migration_unique_services(self, cursor):
+        # Удаляем дубли услуг, накопившиеся от повторного заполнения при старте
+        cursor.execute('''
+            UPDATE appointments
+            SET service_id = (
+                SELECT MIN(s2.id) FROM services s1
+                JOIN services s2 ON s2.category_id IS s1.category_id AND s2.name = s1.name
+                WHERE s1.id = appointments.service_id
+            )
+            WHERE service_id IN (
+                SELECT id FROM services
+                WHERE id NOT IN (SELECT MIN(id) FROM services GROUP BY category_id, name)
+            )
+        ''')
+        cursor.execute('''
+            DELETE FROM services
+            WHERE id NOT IN (SELECT MIN(id) FROM services GROUP BY category_id, name)
+        ''')
+
+        cursor.execute('''
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_services_category_name
+            ON services (category_id, name)
+        ''')
+
+    def _migration_bot_state(self, cursor):
+        # Состояние диалогов бота, переживающее перезапуск
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS bot_user_data (
+                user_id INTEGER PRIMARY KEY,
+                data TEXT NOT NULL
+            )
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS bot_conversations (
+                name TEXT NOT NULL,
+                key TEXT NOT NULL,
+                state TEXT NOT NULL,
+                PRIMARY KEY (name, key)
+            )
+        ''')
+
+    def _migration_schedule(self, cursor):
+        # Мастера и время записи; старые записи остаются без времени
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS masters (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT NOT NULL,
+                active INTEGER NOT NULL DEFAULT 1
+            )
+        ''')
+        cursor.execute("INSERT INTO masters (name) SELECT 'Мастер' WHERE NOT EXISTS (SELECT 1 FROM masters)")
+
+        cursor.execute('ALTER TABLE appointments ADD COLUMN master_id INTEGER REFERENCES masters (id)')
+        cursor.execute('ALTER TABLE appointments ADD COLUMN starts_at TIMESTAMP')
+        cursor.execute('ALTER TABLE appointments ADD COLUMN ends_at TIMESTAMP')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_appointments_master_starts ON appointments (master_id, starts_at)')
+
+    def _migration_normalize_phones(self, cursor):
+        # Telegram ID клиента для узнавания при повторной записи
+        cursor.execute('ALTER TABLE clients ADD COLUMN telegram_user_id INTEGER')
+        cursor.execute('''
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_clients_telegram_user_id
+            ON clients (telegram_user_id) WHERE telegram_user_id IS NOT NULL
+        ''')
+
+        # Один номер в разных форматах — один клиент, по тому же правилу, что в версии 1
+        merged = self._merge_duplicate_clients(cursor, key=lambda phone: normalize_phone(phone) or phone)
+
+        if merged:
+            logger.info(f"Merged {merged} duplicate clients by normalized phone")
+
+    def _migration_client_search(self, cursor):
+        # Полнотекстовый индекс по клиентам (external content: текст хранится только в clients)
+        cursor.execute('''
+            CREATE VIRTUAL TABLE IF NOT EXISTS clients_fts USING fts5(
+                name, phone, content='clients', content_rowid='id'
+            )
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS clients_fts_insert AFTER INSERT ON clients BEGIN
+                INSERT INTO clients_fts (rowid, name, phone) VALUES (new.id, new.name, new.phone);
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS clients_fts_delete AFTER DELETE ON clients BEGIN
+                INSERT INTO clients_fts (clients_fts, rowid, name, phone)
+                VALUES ('delete', old.id, old.name, old.phone);
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS clients_fts_update AFTER UPDATE OF name, phone ON clients BEGIN
+                INSERT INTO clients_fts (clients_fts, rowid, name, phone)
+                VALUES ('delete', old.id, old.name, old.phone);
+                INSERT INTO clients_fts (rowid, name, phone) VALUES (new.id, new.name, new.phone);
+            END
+        ''')
+        cursor.execute("INSERT INTO clients_fts (clients_fts) VALUES ('rebuild')")
+
+        # Последние записи клиента для результатов поиска
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_appointments_client_id ON appointments (client_id, created_at)')
+
+    def _migration_daily_stats(self, cursor):
+        # Итоги по дням и услугам; выручка — по цене услуги на момент записи
+        # (триггеры заменены в миграции 10)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS daily_stats (
+                day TEXT NOT NULL,
+                service_id INTEGER NOT NULL,
+                bookings INTEGER NOT NULL,
+                revenue REAL NOT NULL,
+                PRIMARY KEY (day, service_id)
+            ) WITHOUT ROWID
+        ''')
+        # Триггеры обновляют итоги в той же транзакции, что и запись
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS daily_stats_insert AFTER INSERT ON appointments
+            WHEN new.status != 'cancelled' BEGIN
+                INSERT INTO daily_stats (day, service_id, bookings, revenue)
+                VALUES (date(new.created_at), new.service_id, 1,
+                        COALESCE((SELECT price FROM services WHERE id = new.service_id), 0))
+                ON CONFLICT (day, service_id) DO UPDATE SET
+                    bookings = bookings + 1,
+                    revenue = revenue + excluded.revenue;
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS daily_stats_cancel AFTER UPDATE OF status ON appointments
+            WHEN new.status = 'cancelled' AND old.status != 'cancelled' BEGIN
+                UPDATE daily_stats SET
+                    bookings = bookings - 1,
+                    revenue = revenue - COALESCE((SELECT price FROM services WHERE id = old.service_id), 0)
+                WHERE day = date(old.created_at) AND service_id = old.service_id;
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS daily_stats_delete AFTER DELETE ON appointments
+            WHEN old.status != 'cancelled' BEGIN
+                UPDATE daily_stats SET
+                    bookings = bookings - 1,
+                    revenue = revenue - COALESCE((SELECT price FROM services WHERE id = old.service_id), 0)
+                WHERE day = date(old.created_at) AND service_id = old.service_id;
+            END
+        ''')
+        cursor.execute('''
+            INSERT INTO daily_stats (day, service_id, bookings, revenue)
+            SELECT date(a.created_at), a.service_id, COUNT(*), COALESCE(SUM(s.price), 0)
+            FROM appointments a
+            LEFT JOIN services s ON a.service_id = s.id
+            WHERE a.status != 'cancelled' AND a.service_id IS NOT NULL
+            GROUP BY date(a.created_at), a.service_id
+        ''')
+
+    def _rebuild_daily_stats(self, cursor):
+        # Дни раньше самой старой записи в базе относятся к архиву, их итоги не трогаем
+        cursor.execute('''
+            DELETE FROM daily_stats
+            WHERE day >= COALESCE((SELECT date(MIN(created_at)) FROM appointments), '9999-12-31')
+        ''')
+        cursor.execute('''
+            INSERT INTO daily_stats (day, service_id, bookings, revenue)
+            SELECT date(a.created_at), a.service_id, COUNT(*), COALESCE(SUM(COALESCE(a.price, s.price)), 0)
+            FROM appointments a
+            LEFT JOIN services s ON a.service_id = s.id
+            WHERE a.status != 'cancelled' AND a.service_id IS NOT NULL
+            GROUP BY date(a.created_at), a.service_id
+        ''')
+
+    def _migration_archive(self, cursor):
+        # Записи удаляются только при переносе в архив, а их итоги должны остаться в daily_stats
+        cursor.execute('DROP TRIGGER IF EXISTS daily_stats_delete')
+
+    def _migration_booking_price(self, cursor):
+        # Цена услуги на момент записи: отмена и пересчёт итогов не зависят от
+        # последующих изменений прайса. У старых записей цена неизвестна (NULL)
+        cursor.execute('ALTER TABLE appointments ADD COLUMN price REAL')
+        cursor.execute('DROP TRIGGER IF EXISTS daily_stats_insert')
+        cursor.execute('DROP TRIGGER IF EXISTS daily_stats_cancel')
+        cursor.execute('''
+            CREATE TRIGGER daily_stats_insert AFTER INSERT ON appointments
+            WHEN new.status != 'cancelled' BEGIN
+                INSERT INTO daily_stats (day, service_id, bookings, revenue)
+                VALUES (date(new.created_at), new.service_id, 1,
+                        COALESCE(new.price, (SELECT price FROM services WHERE id = new.service_id), 0))
+                ON CONFLICT (day, service_id) DO UPDATE SET
+                    bookings = bookings + 1,
+                    revenue = revenue + excluded.revenue;
+            END
+        ''')
+        # Для записей без цены вычитается средняя цена дня: прибавленная при
+        # записи цена неизвестна, а текущая могла измениться
+        cursor.execute('''
+            CREATE TRIGGER daily_stats_cancel AFTER UPDATE OF status ON appointments
+            WHEN new.status = 'cancelled' AND old.status != 'cancelled' BEGIN
+                UPDATE daily_stats SET
+                    bookings = bookings - 1,
+                    revenue = revenue - COALESCE(old.price, revenue / bookings)
+                WHERE day = date(old.created_at) AND service_id = old.service_id AND bookings > 0;
+            END
+        ''')
+
     def _add_initial_data(self, cursor):
         try:
             # Добавляем категории
@@ -108,120 +600,178 @@ class Database:
             raise
 
     # Методы для работы с категориями
-    def get_categories(self):
+    def load_catalog(self):
         try:
-            with self.get_connection() as conn:
-                cursor = conn.cursor()
-                cursor.execute('SELECT id, name FROM categories ORDER BY id')
-                return cursor.fetchall()
+            with self.read() as conn:
+                self.catalog.load(conn)
         except Exception as e:
-            logger.error(f"Error getting categories: {e}")
-            return []
+            logger.error(f"Error loading catalog: {e}")
+            raise
+
+    def get_categories(self):
+        return self.catalog.get_categories()
+
+    def get_category_id(self, category_name):
+        return self.catalog.get_category_id(category_name)
 
     def get_category_name(self, category_id):
-        try:
-            with self.get_connection() as conn:
-                cursor = conn.cursor()
-                cursor.execute('SELECT name FROM categories WHERE id = ?', (category_id,))
-                result = cursor.fetchone()
-                return result['name'] if result else None
-        except Exception as e:
-            logger.error(f"Error getting category name: {e}")
-            return None
+        return self.catalog.get_category_name(category_id)
 
     # Методы для работы с услугами
     def get_services_by_category(self, category_id):
-        try:
-            with self.get_connection() as conn:
-                cursor = conn.cursor()
-                cursor.execute('''
-                    SELECT id, name, price, duration
-                    FROM services
-                    WHERE category_id = ?
-                    ORDER BY id
-                ''', (category_id,))
-                return cursor.fetchall()
-        except Exception as e:
-            logger.error(f"Error getting services: {e}")
-            return []
+        return self.catalog.get_services(category_id)
 
     def get_service(self, service_id):
-        try:
-            with self.get_connection() as conn:
-                cursor = conn.cursor()
-                cursor.execute('''
-                    SELECT s.id, s.name, s.price, s.duration, c.name as category_name
-                    FROM services s
-                    JOIN categories c ON s.category_id = c.id
-                    WHERE s.id = ?
-                ''', (service_id,))
-                result = cursor.fetchone()
-                if result:
-                    return (result['id'], result['name'], result['price'],
-                           result['duration'], result['category_name'])
-                return None
-        except Exception as e:
-            logger.error(f"Error getting service: {e}")
-            return None
+        return self.catalog.get_service(service_id)
 
     def update_service(self, service_id, name, price, duration):
         try:
-            with self.get_connection() as conn:
+            with self.write() as conn:
                 cursor = conn.cursor()
                 cursor.execute('''
                     UPDATE services
                     SET name = ?, price = ?, duration = ?
                     WHERE id = ?
                 ''', (name, price, duration, service_id))
-                conn.commit()
-                return True
+            self.load_catalog()
+            return True
         except Exception as e:
             logger.error(f"Error updating service: {e}")
             return False
 
     def delete_service(self, service_id):
         try:
-            with self.get_connection() as conn:
+            with self.write() as conn:
                 cursor = conn.cursor()
                 cursor.execute('DELETE FROM services WHERE id = ?', (service_id,))
-                conn.commit()
-                return True
+            self.load_catalog()
+            return True
         except Exception as e:
             logger.error(f"Error deleting service: {e}")
             return False
 
     def add_service(self, category_id, name, price, duration):
         try:
-            with self.get_connection() as conn:
+            with self.write() as conn:
                 cursor = conn.cursor()
                 cursor.execute('''
                     INSERT INTO services (category_id, name, price, duration)
                     VALUES (?, ?, ?, ?)
                 ''', (category_id, name, price, duration))
-                conn.commit()
-                return cursor.lastrowid
+            self.load_catalog()
+            return cursor.lastrowid
         except Exception as e:
             logger.error(f"Error adding service: {e}")
             return None
 
-    # Методы для работы с клиентами
-    def add_client(self, name, phone):
+    # Методы для работы с расписанием
+    def load_schedule(self):
+        """Загружает мастеров и будущие записи в индекс свободного времени."""
         try:
-            with self.get_connection() as conn:
+            with self.read() as conn:
                 cursor = conn.cursor()
+                cursor.execute('SELECT id, name FROM masters WHERE active = 1 ORDER BY id')
+                masters = [(row['id'], row['name']) for row in cursor.fetchall()]
                 cursor.execute('''
-                    INSERT INTO clients (name, phone)
-                    VALUES (?, ?)
-                ''', (name, phone))
-                conn.commit()
-                return cursor.lastrowid
+                    SELECT master_id, starts_at, ends_at FROM appointments
+                    WHERE ends_at > ? AND master_id IS NOT NULL AND status != 'cancelled'
+                ''', (datetime.now().strftime(TIMESTAMP_FORMAT),))
+                intervals = [tuple(row) for row in cursor.fetchall()]
+                cursor.execute('''
+                    SELECT MAX((julianday(ends_at) - julianday(starts_at)) * 1440) FROM appointments
+                    WHERE starts_at IS NOT NULL
+                ''')
+                longest = cursor.fetchone()[0] or 0
+            self.slots.load(masters, intervals)
+            self._longest_booking = max(self._longest_booking, int(longest) + 1)
+        except Exception as e:
+            logger.error(f"Error loading schedule: {e}")
+            raise
+
+    def get_masters(self):
+        return list(self.slots.masters)
+
+    def add_master(self, name):
+        try:
+            with self.write() as conn:
+                cursor = conn.cursor()
+                cursor.execute('INSERT INTO masters (name) VALUES (?)', (name,))
+            self.load_schedule()
+            return cursor.lastrowid
+        except Exception as e:
+            logger.error(f"Error adding master: {e}")
+            return None
+
+    def get_duration(self, service_id):
+        return self.catalog.get_duration(service_id)
+
+    def cancel_appointment(self, appointment_id):
+        """Отменяет запись и освобождает её время в индексе."""
+        try:
+            with self.write() as conn:
+                cursor = conn.cursor()
+                # Без RETURNING (SQLite 3.35+): строка читается под той же блокировкой writer
+                cursor.execute('''
+                    SELECT master_id, starts_at, ends_at FROM appointments
+                    WHERE id = ? AND status != 'cancelled'
+                ''', (appointment_id,))
+                row = cursor.fetchone()
+                if row:
+                    cursor.execute("UPDATE appointments SET status = 'cancelled' WHERE id = ?", (appointment_id,))
+            if row and row['starts_at']:
+                self.slots.remove(
+                    row['master_id'],
+                    datetime.strptime(row['starts_at'], TIMESTAMP_FORMAT),
+                    datetime.strptime(row['ends_at'], TIMESTAMP_FORMAT)
+                )
+            return row is not None
+        except Exception as e:
+            logger.error(f"Error cancelling appointment: {e}")
+            return False
+
+    # Методы для работы с клиентами
+    def add_client(self, name, phone, user_id=None):
+        try:
+            with self.write() as conn:
+                return self._upsert_client(conn.cursor(), name, phone, user_id)
         except Exception as e:
             logger.error(f"Error adding client: {e}")
             return None
 
+    def _upsert_client(self, cursor, name, phone, user_id=None):
+        # Клиент ищется по нормализованному телефону, имя обновляется
+        phone = normalize_phone(phone) or phone
+        if user_id is not None:
+            # Telegram ID принадлежит одному клиенту: у прежнего номера его снимаем
+            cursor.execute(
+                'UPDATE clients SET telegram_user_id = NULL WHERE telegram_user_id = ? AND phone != ?',
+                (user_id, phone)
+            )
+        cursor.execute('''
+            INSERT INTO clients (name, phone, telegram_user_id) VALUES (?, ?, ?)
+            ON CONFLICT (phone) DO UPDATE SET
+                name = excluded.name,
+                telegram_user_id = COALESCE(excluded.telegram_user_id, telegram_user_id)
+        ''', (name, phone, user_id))
+        # lastrowid не меняется при обновлении существующего клиента, RETURNING
+        # требует SQLite 3.35+: id читается по уникальному телефону
+        cursor.execute('SELECT id FROM clients WHERE phone = ?', (phone,))
+        return cursor.fetchone()['id']
+
+    def get_client_by_user(self, user_id):
+        """Клиент (id, name, phone), ранее записывавшийся из этого Telegram-аккаунта."""
+        try:
+            with self.read() as conn:
+                cursor = conn.cursor()
+                cursor.execute('SELECT id, name, phone FROM clients WHERE telegram_user_id = ?', (user_id,))
+                return cursor.fetchone()
+        except Exception as e:
+            logger.error(f"Error getting client by user: {e}")
+            return None
+
     def get_clients(self):
         try:
-            with self.get_connection() as conn:
+            with self.read() as conn:
                 cursor = conn.cursor()
                 cursor.execute('SELECT id, name, phone, created_at FROM clients ORDER BY created_at DESC')
                 return cursor.fetchall()
@@ -229,29 +779,235 @@ class Database:
             logger.error(f"Error getting clients: {e}")
             return []
 
+    def get_clients_page(self, after=None, before=None, limit=20):
+        """Страница клиентов от новых к старым с keyset-пагинацией.
+
+        after/before — ключ (created_at, id) границы соседней страницы:
+        after листает к более старым клиентам, before — к более новым.
+        Возвращает (rows, has_newer, has_older).
+        """
+        try:
+            with self.read() as conn:
+                cursor = conn.cursor()
+                if before:
+                    cursor.execute('''
+                        SELECT id, name, phone, created_at FROM clients
+                        WHERE (created_at, id) > (?, ?)
+                        ORDER BY created_at, id
+                        LIMIT ?
+                    ''', (before[0], before[1], limit + 1))
+                    rows = cursor.fetchall()
+                    has_newer = len(rows) > limit
+                    return list(reversed(rows[:limit])), has_newer, True
+
+                if after:
+                    cursor.execute('''
+                        SELECT id, name, phone, created_at FROM clients
+                        WHERE (created_at, id) < (?, ?)
+                        ORDER BY created_at DESC, id DESC
+                        LIMIT ?
+                    ''', (after[0], after[1], limit + 1))
+                else:
+                    cursor.execute('''
+                        SELECT id, name, phone, created_at FROM clients
+                        ORDER BY created_at DESC, id DESC
+                        LIMIT ?
+                    ''', (limit + 1,))
+                rows = cursor.fetchall()
+                return rows[:limit], bool(after), len(rows) > limit
+        except Exception as e:
+            logger.error(f"Error getting clients page: {e}")
+            return [], False, False
+
+    def search_clients(self, query, limit=10, recent=3):
+        """Поиск клиентов по имени (FTS5, по началу слов) или по первым цифрам телефона.
+
+        Возвращает [(client, [последние записи])], не больше limit клиентов
+        и recent записей у каждого.
+        """
+        try:
+            with self.read() as conn:
+                cursor = conn.cursor()
+                prefix = phone_prefix(query)
+                if prefix:
+                    # Префикс телефона — диапазон по уникальному индексу idx_clients_phone
+                    upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+                    cursor.execute('''
+                        SELECT id, name, phone, created_at FROM clients
+                        WHERE phone >= ? AND phone < ?
+                        ORDER BY phone
+                        LIMIT ?
+                    ''', (prefix, upper, limit))
+                else:
+                    match = self._fts_query(query)
+                    if not match:
+                        return []
+                    cursor.execute('''
+                        SELECT c.id, c.name, c.phone, c.created_at
+                        FROM clients_fts
+                        JOIN clients c ON c.id = clients_fts.rowid
+                        WHERE clients_fts MATCH ?
+                        ORDER BY clients_fts.rowid DESC
+                        LIMIT ?
+                    ''', (match, limit))
+                clients = cursor.fetchall()
+                if not clients:
+                    return []
+
+                placeholders = ','.join('?' * len(clients))
+                cursor.execute(f'''
+                    SELECT client_id, created_at, starts_at, status, service_name, category_name, price
+                    FROM (
+                        SELECT a.client_id, a.created_at, a.starts_at, a.status,
+                               s.name as service_name, cat.name as category_name,
+                               COALESCE(a.price, s.price) as price,
+                               ROW_NUMBER() OVER (
+                                   PARTITION BY a.client_id ORDER BY a.created_at DESC, a.id DESC
+                               ) as position
+                        FROM appointments a
+                        JOIN services s ON a.service_id = s.id
+                        JOIN categories cat ON s.category_id = cat.id
+                        WHERE a.client_id IN ({placeholders})
+                    )
+                    WHERE position <= ?
+                ''', [client['id'] for client in clients] + [recent])
+                appointments = {}
+                for row in cursor.fetchall():
+                    appointments.setdefault(row['client_id'], []).append(row)
+
+                return [(client, appointments.get(client['id'], [])) for client in clients]
+        except Exception as e:
+            logger.error(f"Error searching clients: {e}")
+            return []
+
+    @staticmethod
+    def _fts_query(query):
+        # Каждое слово — префикс в кавычках, чтобы спецсимволы FTS5 не ломали запрос
+        words = [word.replace('"', '') for word in query.split()]
+        return ' '.join(f'"{word}"*' for word in words if word)
+
     # Методы для работы с записями
     def add_appointment(self, client_id, service_id):
         try:
-            with self.get_connection() as conn:
+            with self.write() as conn:
                 cursor = conn.cursor()
                 cursor.execute('''
-                    INSERT INTO appointments (client_id, service_id)
-                    VALUES (?, ?)
-                ''', (client_id, service_id))
-                conn.commit()
+                    INSERT INTO appointments (client_id, service_id, price)
+                    VALUES (?, ?, (SELECT price FROM services WHERE id = ?))
+                ''', (client_id, service_id, service_id))
                 return cursor.lastrowid
         except Exception as e:
             logger.error(f"Error adding appointment: {e}")
             return None
 
+    def book(self, name, phone, service_id, slot=None, user_id=None):
+        """Атомарно сохраняет клиента и его запись.
+
+        slot — (master_id, начало как datetime); если задан, запись получает
+        время, а пересечение с другими записями мастера отклоняется
+        исключением SlotTakenError. user_id — Telegram ID клиента для
+        узнавания при следующей записи. Возвращает (client_id, appointment_id,
+        service), где service берётся из кэша каталога, либо None при ошибке.
+        """
+        try:
+            with self.write() as conn:
+                client_id, appointment_id, interval = self._book(
+                    conn.cursor(), name, phone, service_id, slot, user_id
+                )
+            if interval:
+                self.slots.add(*interval)
+            return client_id, appointment_id, self.catalog.get_service(service_id)
+        except SlotTakenError:
+            raise
+        except Exception as e:
+            logger.error(f"Error booking appointment: {e}")
+            return None
+
+    def book_many(self, bookings):
+        """Сохраняет пачку записей [(name, phone, service_id[, slot[, user_id]]), ...] одним коммитом.
+
+        Каждая запись выполняется в своей точке сохранения: ошибка одной не
+        отменяет остальные. Результаты возвращаются в том же порядке, что и
+        у book(): None для неудачных и экземпляр SlotTakenError для записей
+        на занятое время.
+        """
+        results = []
+        intervals = []
+        try:
+            with self.write() as conn:
+                cursor = conn.cursor()
+                # sqlite3 сам открывает транзакцию только перед DML, а SAVEPOINT вне
+                # транзакции стал бы отдельной транзакцией с коммитом на RELEASE
+                cursor.execute('BEGIN')
+                for booking in bookings:
+                    cursor.execute('SAVEPOINT booking')
+                    try:
+                        client_id, appointment_id, interval = self._book(cursor, *booking)
+                        cursor.execute('RELEASE booking')
+                        if interval:
+                            intervals.append(interval)
+                        results.append((client_id, appointment_id, self.catalog.get_service(booking[2])))
+                    except (sqlite3.Error, SlotTakenError) as e:
+                        if not isinstance(e, SlotTakenError):
+                            logger.error(f"Error booking appointment: {e}")
+                        cursor.execute('ROLLBACK TO booking')
+                        cursor.execute('RELEASE booking')
+                        results.append(e if isinstance(e, SlotTakenError) else None)
+            for interval in intervals:
+                self.slots.add(*interval)
+            return results
+        except Exception as e:
+            logger.error(f"Error committing booking batch: {e}")
+            return [None] * len(bookings)
+
+    def _book(self, cursor, name, phone, service_id, slot=None, user_id=None):
+        interval = None
+        if slot:
+            master_id, start = slot
+            minutes = self.catalog.get_duration(service_id)
+            end = start + timedelta(minutes=minutes)
+            self._longest_booking = max(self._longest_booking, minutes)
+            # Пересекаться могут только записи, начавшиеся не раньше чем за самую
+            # длинную запись до start: поиск по индексу (master_id, starts_at) ограничен
+            # с двух сторон, а не идёт по всей истории мастера.
+            # Проверка и вставка идут в одной транзакции под блокировкой writer
+            earliest = start - timedelta(minutes=self._longest_booking)
+            cursor.execute('''
+                SELECT 1 FROM appointments
+                WHERE master_id = ? AND starts_at > ? AND starts_at < ? AND ends_at > ?
+                  AND status != 'cancelled'
+                LIMIT 1
+            ''', (master_id, earliest.strftime(TIMESTAMP_FORMAT), end.strftime(TIMESTAMP_FORMAT),
+                  start.strftime(TIMESTAMP_FORMAT)))
+            if cursor.fetchone():
+                raise SlotTakenError(f"Master {master_id} is busy at {start}")
+            interval = (master_id, start, end)
+
+        client_id = self._upsert_client(cursor, name, phone, user_id)
+
+        # Цена фиксируется в записи в той же транзакции
+        if interval:
+            cursor.execute('''
+                INSERT INTO appointments (client_id, service_id, master_id, starts_at, ends_at, price)
+                VALUES (?, ?, ?, ?, ?, (SELECT price FROM services WHERE id = ?))
+            ''', (client_id, service_id, interval[0],
+                  interval[1].strftime(TIMESTAMP_FORMAT), interval[2].strftime(TIMESTAMP_FORMAT), service_id))
+        else:
+            cursor.execute('''
+                INSERT INTO appointments (client_id, service_id, price)
+                VALUES (?, ?, (SELECT price FROM services WHERE id = ?))
+            ''', (client_id, service_id, service_id))
+        return client_id, cursor.lastrowid, interval
+
     def get_appointments_last_30_days(self):
         try:
-            with self.get_connection() as conn:
+            with self.read() as conn:
                 cursor = conn.cursor()
-                thirty_days_ago = (datetime.now() - timedelta(days=30)).strftime('%Y-%m-%d %H:%M:%S')
+                thirty_days_ago = days_ago(30)
                 cursor.execute('''
                     SELECT a.id, c.name, c.phone, s.name as service_name,
-                           s.price, s.duration, cat.name as category_name, a.created_at
+                           COALESCE(a.price, s.price) as price, s.duration, cat.name as category_name,
+                           a.created_at, a.starts_at
                     FROM appointments a
                     JOIN clients c ON a.client_id = c.id
                     JOIN services s ON a.service_id = s.id
@@ -263,3 +1019,409 @@ class Database:
         except Exception as e:
             logger.error(f"Error getting appointments: {e}")
             return []
+
+    def get_appointments_chunk(self, since, after=None, limit=200):
+        """Очередная порция записей с created_at >= since, от новых к старым.
+
+        after — ключ (created_at, id) последней записи предыдущей порции.
+        """
+        try:
+            with self.read() as conn:
+                cursor = conn.cursor()
+                # Верхняя граница порции — ключ предыдущей, иначе «бесконечность»
+                upper = after if after else ('9999-12-31', 0)
+                cursor.execute('''
+                    SELECT a.id, c.name, c.phone, s.name as service_name,
+                           COALESCE(a.price, s.price) as price, s.duration, cat.name as category_name,
+                           a.created_at, a.starts_at, a.status
+                    FROM appointments a
+                    JOIN clients c ON a.client_id = c.id
+                    JOIN services s ON a.service_id = s.id
+                    JOIN categories cat ON s.category_id = cat.id
+                    WHERE a.created_at >= ? AND a.created_at <= ?
+                      AND (a.created_at < ? OR a.id < ?)
+                    ORDER BY a.created_at DESC, a.id DESC
+                    LIMIT ?
+                ''', (since, upper[0], upper[0], upper[1], limit))
+                return cursor.fetchall()
+        except Exception as e:
+            logger.error(f"Error getting appointments chunk: {e}")
+            return []
+
+    # Методы для работы со статистикой
+    def rebuild_daily_stats(self):
+        """Пересчитывает daily_stats по записям в базе.
+
+        Выручка — по цене на момент записи; у записей, сделанных до
+        сохранения цены в appointments, — по текущей цене услуги.
+        """
+        try:
+            with self.write() as conn:
+                self._rebuild_daily_stats(conn.cursor())
+            return True
+        except Exception as e:
+            logger.error(f"Error rebuilding daily stats: {e}")
+            return False
+
+    def get_daily_stats(self, date_from, date_to):
+        """Итоги за дни с date_from по date_to включительно ('ГГГГ-ММ-ДД') только по daily_stats.
+
+        Стоимость — O(дней × услуг), а не O(записей). Возвращает словарь с
+        ключами total (count, revenue), by_service (category_name, service_name,
+        count, revenue), by_category (category_name, count, revenue) и by_day
+        (day, count, revenue). Названия берутся из кэша каталога.
+        """
+        try:
+            with self.read() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    SELECT service_id, SUM(bookings) as count, SUM(revenue) as revenue
+                    FROM daily_stats
+                    WHERE day BETWEEN ? AND ?
+                    GROUP BY service_id
+                ''', (date_from, date_to))
+                services = cursor.fetchall()
+
+                cursor.execute('''
+                    SELECT day, SUM(bookings) as count, SUM(revenue) as revenue
+                    FROM daily_stats
+                    WHERE day BETWEEN ? AND ?
+                    GROUP BY day
+                    HAVING SUM(bookings) > 0
+                    ORDER BY day DESC
+                ''', (date_from, date_to))
+                by_day = [dict(row) for row in cursor.fetchall()]
+
+            by_service = []
+            by_category = {}
+            for row in services:
+                if not row['count']:
+                    continue
+                service = self.catalog.get_service(row['service_id'])
+                service_name = service[1] if service else f"Услуга #{row['service_id']}"
+                category_name = (service[4] if service else None) or "Без категории"
+                by_service.append({
+                    'category_name': category_name,
+                    'service_name': service_name,
+                    'count': row['count'],
+                    'revenue': row['revenue']
+                })
+                category = by_category.setdefault(
+                    category_name, {'category_name': category_name, 'count': 0, 'revenue': 0}
+                )
+                category['count'] += row['count']
+                category['revenue'] += row['revenue']
+
+            by_service.sort(key=lambda row: (row['category_name'], -row['revenue']))
+            return {
+                'total': {
+                    'count': sum(row['count'] for row in by_service),
+                    'revenue': sum(row['revenue'] for row in by_service)
+                },
+                'by_service': by_service,
+                'by_category': sorted(by_category.values(), key=lambda row: -row['revenue']),
+                'by_day': by_day
+            }
+        except Exception as e:
+            logger.error(f"Error getting daily stats: {e}")
+            return None
+
+    # Резервное копирование и архив
+    def backup(self, path, pages=256, pause=0.01):
+        """Горячая копия базы в path, не блокирующая запись дольше одного шага."""
+        return self.pool.backup(path, pages=pages, pause=pause)
+
+    def archive_appointments(self, before_day, archive_path, batch_size=500):
+        """Переносит записи, визит по которым прошёл до дня before_day ('ГГГГ-ММ-ДД'), в архивную базу.
+
+        Время визита — окончание записи, для записей без времени — дата
+        создания; отменённые записи переносятся по дате создания. Будущие
+        записи остаются в основной базе и продолжают занимать время мастера.
+        В архив попадают самодостаточные строки (с именем и телефоном клиента,
+        услугой и ценой), а также клиенты без Telegram ID, созданные раньше
+        before_day, у которых не осталось записей: клиенты с Telegram ID
+        остаются, чтобы бот узнавал их при следующей записи. Перенос идёт
+        порциями по batch_size, блокировка writer отпускается между ними.
+        Итоги в daily_stats сохраняются. Возвращает (записей, клиентов).
+        """
+        moved_appointments = moved_clients = 0
+        with self.write() as conn:
+            conn.execute('ATTACH DATABASE ? AS archive', (archive_path,))
+
+        # Всё после ATTACH — внутри try, чтобы архив отключился при любой ошибке
+        try:
+            with self.write() as conn:
+                conn.execute('PRAGMA archive.journal_mode=WAL')
+                conn.execute('PRAGMA archive.synchronous=NORMAL')
+                conn.execute('''
+                    CREATE TABLE IF NOT EXISTS archive.appointments (
+                        id INTEGER PRIMARY KEY,
+                        client_id INTEGER,
+                        service_id INTEGER,
+                        status TEXT,
+                        created_at TIMESTAMP,
+                        master_id INTEGER,
+                        starts_at TIMESTAMP,
+                        ends_at TIMESTAMP,
+                        client_name TEXT,
+                        client_phone TEXT,
+                        service_name TEXT,
+                        category_name TEXT,
+                        price REAL,
+                        archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    )
+                ''')
+                conn.execute('''
+                    CREATE TABLE IF NOT EXISTS archive.clients (
+                        id INTEGER PRIMARY KEY,
+                        name TEXT,
+                        phone TEXT,
+                        telegram_user_id INTEGER,
+                        created_at TIMESTAMP,
+                        archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    )
+                ''')
+                conn.execute('CREATE INDEX IF NOT EXISTS archive.idx_archive_appointments_created_at ON appointments (created_at)')
+                conn.execute('CREATE INDEX IF NOT EXISTS archive.idx_archive_clients_phone ON clients (phone)')
+
+            last_id = 0
+            while True:
+                # Каждая порция — две транзакции по одной базе: сначала копия
+                # в архив, затем удаление уже скопированного. Повтор после сбоя
+                # безопасен: INSERT OR IGNORE по id.
+                with self.write() as conn:
+                    cursor = conn.cursor()
+                    # Обход по id: оставшиеся будущие записи не просматриваются повторно
+                    cursor.execute('''
+                        SELECT id FROM main.appointments
+                        WHERE id > ?
+                          AND (COALESCE(ends_at, starts_at, created_at) < ?
+                               OR (status = 'cancelled' AND created_at < ?))
+                        ORDER BY id
+                        LIMIT ?
+                    ''', (last_id, before_day, before_day, batch_size))
+                    ids = [row['id'] for row in cursor.fetchall()]
+                    if not ids:
+                        break
+                    last_id = ids[-1]
+                    placeholders = ','.join('?' * len(ids))
+                    cursor.execute(f'''
+                        INSERT OR IGNORE INTO archive.appointments (
+                            id, client_id, service_id, status, created_at, master_id, starts_at, ends_at,
+                            client_name, client_phone, service_name, category_name, price
+                        )
+                        SELECT a.id, a.client_id, a.service_id, a.status, a.created_at,
+                               a.master_id, a.starts_at, a.ends_at,
+                               c.name, c.phone, s.name, cat.name, COALESCE(a.price, s.price)
+                        FROM main.appointments a
+                        LEFT JOIN main.clients c ON a.client_id = c.id
+                        LEFT JOIN main.services s ON a.service_id = s.id
+                        LEFT JOIN main.categories cat ON s.category_id = cat.id
+                        WHERE a.id IN ({placeholders})
+                    ''', ids)
+                    conn.commit()
+                    cursor.execute(f'''
+                        DELETE FROM main.appointments
+                        WHERE id IN (SELECT id FROM archive.appointments WHERE id IN ({placeholders}))
+                    ''', ids)
+                    moved_appointments += cursor.rowcount
+
+            while True:
+                with self.write() as conn:
+                    cursor = conn.cursor()
+                    cursor.execute('''
+                        SELECT c.id FROM main.clients c
+                        WHERE c.created_at < ?
+                          AND c.telegram_user_id IS NULL
+                          AND NOT EXISTS (SELECT 1 FROM main.appointments a WHERE a.client_id = c.id)
+                        LIMIT ?
+                    ''', (before_day, batch_size))
+                    ids = [row['id'] for row in cursor.fetchall()]
+                    if not ids:
+                        break
+                    placeholders = ','.join('?' * len(ids))
+                    cursor.execute(f'''
+                        INSERT OR IGNORE INTO archive.clients (id, name, phone, telegram_user_id, created_at)
+                        SELECT id, name, phone, telegram_user_id, created_at FROM main.clients
+                        WHERE id IN ({placeholders})
+                    ''', ids)
+                    conn.commit()
+                    cursor.execute(f'''
+                        DELETE FROM main.clients
+                        WHERE id IN (SELECT id FROM archive.clients WHERE id IN ({placeholders}))
+                    ''', ids)
+                    moved_clients += cursor.rowcount
+        finally:
+            with self.write() as conn:
+                conn.execute('DETACH DATABASE archive')
+
+        return moved_appointments, moved_clients
+
+    # Методы для хранения состояния бота
+    def get_user_state(self, user_id):
+        try:
+            with self.read() as conn:
+                cursor = conn.cursor()
+                cursor.execute('SELECT data FROM bot_user_data WHERE user_id = ?', (user_id,))
+                result = cursor.fetchone()
+                return json.loads(result['data']) if result else None
+        except Exception as e:
+            logger.error(f"Error getting user state: {e}")
+            return None
+
+    def get_conversation_states(self, name):
+        try:
+            with self.read() as conn:
+                cursor = conn.cursor()
+                cursor.execute('SELECT key, state FROM bot_conversations WHERE name = ?', (name,))
+                return {
+                    tuple(json.loads(row['key'])): json.loads(row['state'])
+                    for row in cursor.fetchall()
+                }
+        except Exception as e:
+            logger.error(f"Error getting conversation states: {e}")
+            return {}
+
+    def save_bot_state(self, user_data, conversations):
+        """Сохраняет изменённое состояние одной транзакцией.
+
+        user_data — {user_id: dict или None для удаления},
+        conversations — {(name, key): state или None для удаления}.
+        """
+        try:
+            with self.write() as conn:
+                cursor = conn.cursor()
+                cursor.executemany(
+                    'INSERT OR REPLACE INTO bot_user_data (user_id, data) VALUES (?, ?)',
+                    [(user_id, json.dumps(data)) for user_id, data in user_data.items() if data is not None]
+                )
+                cursor.executemany(
+                    'DELETE FROM bot_user_data WHERE user_id = ?',
+                    [(user_id,) for user_id, data in user_data.items() if data is None]
+                )
+                cursor.executemany(
+                    'INSERT OR REPLACE INTO bot_conversations (name, key, state) VALUES (?, ?, ?)',
+                    [(name, json.dumps(key), json.dumps(state))
+                     for (name, key), state in conversations.items() if state is not None]
+                )
+                cursor.executemany(
+                    'DELETE FROM bot_conversations WHERE name = ? AND key = ?',
+                    [(name, json.dumps(key)) for (name, key), state in conversations.items() if state is None]
+                )
+            return True
+        except Exception as e:
+            logger.error(f"Error saving bot state: {e}")
+            return False
+
+
+class BookingQueue:
+    """Очередь записей с групповым коммитом для пиковых нагрузок.
+
+    Записи от параллельных get_name копятся не дольше flush_interval секунд
+    (или до max_batch штук) и сохраняются одной транзакцией через
+    Database.book_many. Вызывающий ждёт результата коммита. Очередь
+    ограничена max_size: при переполнении book() ждёт свободного места.
+    """
+
+    def __init__(self, db, max_size=1000, max_batch=100, flush_interval=0.005):
+        self.db = db
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self._queue = asyncio.Queue(maxsize=max_size)
+        self._task = None
+        self._closed = False
+
+    def start(self):
+        self._task = asyncio.get_running_loop().create_task(self._worker())
+
+    async def book(self, name, phone, service_id, slot=None, user_id=None):
+        if self._closed:
+            raise RuntimeError("Booking queue is closed")
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put(((name, phone, service_id, slot, user_id), future))
+        return await future
+
+    async def _worker(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            await self._commit(batch)
+
+    async def _commit(self, batch):
+        try:
+            results = await self.db.book_many([booking for booking, _ in batch])
+        except Exception as e:
+            logger.error(f"Error flushing booking queue: {e}")
+            results = [None] * len(batch)
+
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                if isinstance(result, SlotTakenError):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+            self._queue.task_done()
+
+    async def stop(self):
+        # Перестаём принимать записи и дожидаемся коммита уже поставленных
+        self._closed = True
+        if self._task:
+            await self._queue.join()
+            self._task.cancel()
+            self._task = None
+
+
+class AsyncDatabase:
+    """Асинхронный интерфейс к Database для обработчиков бота.
+
+    Любой публичный метод Database доступен как корутина: вызов выполняется
+    в отдельном потоке БД, поэтому event loop не блокируется на sqlite3.
+    """
+
+    def __init__(self, db=None, max_workers=1):
+        self.db = db if db is not None else Database()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='db')
+
+    def __getattr__(self, name):
+        attr = getattr(self.db, name)
+        if name.startswith('_') or not callable(attr):
+            return attr
+
+        def timed(*args, **kwargs):
+            started = time.perf_counter()
+            result = attr(*args, **kwargs)
+            record_query(name, time.perf_counter() - started, result)
+            return result
+
+        async def call(*args, **kwargs):
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, functools.partial(timed, *args, **kwargs))
+
+        call.__name__ = name
+        return call
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        self.db.close()
+
+
+_instance = None
+_instance_lock = threading.Lock()
+
+
+def get_database(db_name='beauty_bot.db', readers=4):
+    """Единый на процесс экземпляр AsyncDatabase с общим пулом соединений."""
+    global _instance
+    with _instance_lock:
+        if _instance is None:
+            _instance = AsyncDatabase(Database(db_name, readers=readers), max_workers=readers + 1)
+        return _instance
@@ -0,0 +1,193 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from telegram import Update
+from telegram.ext import ApplicationHandlerStop, BaseUpdateProcessor, filters
+from metrics import METRICS
+
+logger = logging.getLogger(__name__)
+
+THROTTLE_WARNING = "Слишком много сообщений. Подождите несколько секунд и попробуйте снова."
+
+
+class PerChatUpdateProcessor(BaseUpdateProcessor):
+    """Параллельная обработка обновлений с сохранением порядка внутри чата.
+
+    Обновления разных чатов обрабатываются одновременно (до
+    max_concurrent_updates), а обновления одного чата — строго по очереди,
+    поэтому шаги диалога записи не перемешиваются.
+
+    Семафор базового класса берётся до блокировки чата, и очередь одного
+    занятого чата занимала бы все слоты. Поэтому базовому классу передаётся
+    заведомо большой предел, а свой семафор берётся уже после блокировки:
+    слот занимает только обновление, которое действительно выполняется.
+    """
+
+    # Предел для BaseUpdateProcessor: число ожидающих обновлений не ограничивает
+    UNLIMITED = 2 ** 31 - 1
+
+    def __init__(self, max_concurrent_updates):
+        super().__init__(self.UNLIMITED)
+        self.limit = max_concurrent_updates
+        self._running = asyncio.Semaphore(max_concurrent_updates)
+        # chat_id -> [lock, число ожидающих обновлений]
+        self._chat_locks = {}
+
+    @staticmethod
+    def _chat_key(update):
+        if isinstance(update, Update):
+            if update.effective_chat:
+                return update.effective_chat.id
+            if update.effective_user:
+                return update.effective_user.id
+        return None
+
+    async def do_process_update(self, update, coroutine):
+        key = self._chat_key(update)
+        if key is None:
+            async with self._running:
+                await coroutine
+            return
+
+        entry = self._chat_locks.get(key)
+        if entry is None:
+            entry = self._chat_locks[key] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0], self._running:
+                await coroutine
+        finally:
+            entry[1] -= 1
+            # Блокировки неактивных чатов не храним
+            if not entry[1]:
+                del self._chat_locks[key]
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+
+class MessageRouter:
+    """Выбор обработчика текстового сообщения по точному тексту кнопки.
+
+    Вместо цепочки MessageHandler с регулярными выражениями, которые PTB
+    проверяет по очереди, текст ищется в словаре. Кнопки категорий берутся
+    из MenuRenderer, и таблица пересобирается при смене версии каталога.
+    Сообщения без маршрута передаются в fallback.
+    """
+
+    def __init__(self, menus, fallback):
+        self.menus = menus
+        self.fallback = fallback
+        self._routes = {}
+        self._category_handler = None
+        self._version = None
+        self._table = {}
+
+    def add(self, text, handler):
+        self._routes[text] = handler
+        self._version = None
+
+    def add_categories(self, handler):
+        """Обработчик для кнопок всех категорий каталога."""
+        self._category_handler = handler
+        self._version = None
+
+    def _ensure_fresh(self):
+        version = self.menus.version
+        if version == self._version:
+            return
+        table = {}
+        if self._category_handler:
+            table = dict.fromkeys(self.menus.category_names, self._category_handler)
+        # Статические кнопки важнее категорий с тем же названием
+        table.update(self._routes)
+        self._table = table
+        self._version = version
+
+    def resolve(self, text):
+        self._ensure_fresh()
+        return self._table.get(text, self.fallback)
+
+    async def dispatch(self, update, context):
+        handler = self.resolve(update.message.text)
+        return await handler(update, context)
+
+
+class ServiceButtonFilter(filters.MessageFilter):
+    """Сообщение — кнопка услуги из текущего каталога (поиск по словарю)."""
+
+    def __init__(self, menus):
+        super().__init__(name='ServiceButtonFilter')
+        self.menus = menus
+
+    def filter(self, message):
+        return bool(message.text) and self.menus.is_service_button(message.text)
+
+
+class UpdateThrottle:
+    """Ограничение частоты обновлений от одного пользователя (token bucket).
+
+    У каждого пользователя корзина на burst токенов, пополняемая со
+    скоростью rate в секунду; обновление без токена отбрасывается до
+    обработчиков. Предупреждение отправляется один раз за серию лишних
+    обновлений, остальные отбрасываются молча и не тратят лимит отправки
+    Telegram. Корзины хранятся в OrderedDict не больше max_users штук:
+    вытесняется пользователь, дольше всех не присылавший обновлений, даже
+    если его корзина ещё не пополнилась — при следующем обновлении он
+    просто получит полную корзину.
+    """
+
+    def __init__(self, rate=1.0, burst=5, max_users=10000, exempt=(), clock=time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self.max_users = max_users
+        self.exempt = frozenset(exempt)
+        self._clock = clock
+        # user_id -> [токены, время обновления, предупреждён ли]
+        self._buckets = OrderedDict()
+        self.dropped = 0
+
+    def allow(self, user_id):
+        """Списывает токен; False — если пользователь превысил лимит."""
+        now = self._clock()
+        bucket = self._buckets.get(user_id)
+        if bucket is None:
+            bucket = self._buckets[user_id] = [float(self.burst), now, False]
+            if len(self._buckets) > self.max_users:
+                self._buckets.popitem(last=False)
+        else:
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+            self._buckets.move_to_end(user_id)
+
+        if bucket[0] >= 1:
+            bucket[0] -= 1
+            bucket[2] = False
+            return True
+        return False
+
+    async def check(self, update, context):
+        """Обработчик группы -1: лишние обновления не доходят до остальных групп."""
+        user = update.effective_user if isinstance(update, Update) else None
+        if user is None or user.id in self.exempt or self.allow(user.id):
+            return
+
+        self.dropped += 1
+        METRICS.inc('bot_throttled_updates_total', 'message' if update.message else 'other')
+        bucket = self._buckets[user.id]
+        if not bucket[2]:
+            bucket[2] = True
+            logger.warning(f"Пользователь {user.id} превысил лимит сообщений")
+            if update.message:
+                try:
+                    await update.message.reply_text(THROTTLE_WARNING)
+                except Exception as e:
+                    logger.error(f"Ошибка отправки предупреждения о лимите: {e}")
+        raise ApplicationHandlerStop
+
+    def __len__(self):
+        return len(self._buckets)
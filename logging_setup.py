@@ -0,0 +1,50 @@
+import atexit
+import json
+import logging
+import queue
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+
+class JsonFormatter(logging.Formatter):
+    """Одна запись лога — один JSON-объект в строке."""
+
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage()
+        }
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+def setup_logging(filename='bot.log', level=logging.INFO, max_bytes=10 * 1024 * 1024,
+                  backup_count=5, json_format=False):
+    """Настраивает логирование через очередь.
+
+    Обработчики бота только кладут записи в очередь, а запись в файл с
+    ротацией по размеру выполняет отдельный поток QueueListener.
+    """
+    file_handler = RotatingFileHandler(
+        filename, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8'
+    )
+    file_handler.setFormatter(JsonFormatter() if json_format else logging.Formatter(LOG_FORMAT))
+
+    log_queue = queue.SimpleQueue()
+    listener = QueueListener(log_queue, file_handler, respect_handler_level=True)
+
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(QueueHandler(log_queue))
+    root.setLevel(level)
+
+    listener.start()
+    # Дописываем оставшиеся записи при выходе
+    atexit.register(listener.stop)
+    return listener
@@ -1,25 +1,59 @@
 import logging
-from telegram.ext import Application, CommandHandler, MessageHandler, filters, ConversationHandler
+from telegram import Update
+from telegram.ext import Application, CommandHandler, MessageHandler, CallbackQueryHandler, TypeHandler, filters, ConversationHandler
 from config import Config
-from client import ClientHandler, PHONE, NAME
+from logging_setup import setup_logging
+from client import ClientHandler, PHONE, NAME, SLOT
 from admin import AdminHandler
-
-# Настройка логирования
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO,
-    filename='bot.log',
-    encoding='utf-8'
+from database import get_database
+from persistence import SQLitePersistence
+from dispatch import PerChatUpdateProcessor, MessageRouter, ServiceButtonFilter, UpdateThrottle
+from metrics import METRICS, serve_metrics
+
+# Настройка логирования: запись в файл идёт в отдельном потоке
+setup_logging(
+    filename=Config.LOG_FILE,
+    level=Config.LOG_LEVEL,
+    max_bytes=Config.LOG_MAX_BYTES,
+    backup_count=Config.LOG_BACKUP_COUNT,
+    json_format=Config.LOG_JSON
 )
 logger = logging.getLogger(__name__)
 
 class BeautyBot:
-    def __init__(self):
+    def __init__(self, request=None):
         self.client_handler = ClientHandler()
         self.admin_handler = AdminHandler()
+        self.metrics_server = None
+        # Администраторы не ограничиваются
+        self.throttle = UpdateThrottle(
+            rate=Config.THROTTLE_RATE,
+            burst=Config.THROTTLE_BURST,
+            max_users=Config.THROTTLE_MAX_USERS,
+            exempt=Config.ADMIN_IDS
+        )
+        self.register_metrics()
 
         try:
-            self.application = Application.builder().token(Config.BOT_TOKEN).build()
+            builder = Application.builder()
+            if request is not None:
+                # Подмена HTTP-транспорта (бенчмарки без сети)
+                builder = builder.request(request).get_updates_request(request)
+
+            self.application = (
+                builder
+                .token(Config.BOT_TOKEN)
+                .concurrent_updates(PerChatUpdateProcessor(Config.CONCURRENT_UPDATES))
+                .persistence(SQLitePersistence(
+                    get_database(),
+                    update_interval=Config.PERSISTENCE_INTERVAL,
+                    max_users=Config.SESSION_MAX_ENTRIES,
+                    ttl=Config.SESSION_TTL
+                ))
+                .post_init(self.startup)
+                .post_shutdown(self.shutdown)
+                .build()
+            )
             logger.info("Приложение бота создано успешно")
         except Exception as e:
             logger.error(f"Ошибка создания приложения: {e}")
@@ -27,51 +61,70 @@ class BeautyBot:
 
     def setup_handlers(self):
         try:
+            # Ограничение частоты: группа -1 выполняется раньше всех обработчиков
+            if Config.THROTTLE_RATE:
+                self.application.add_handler(TypeHandler(Update, self.throttle.check), group=-1)
+
             # Обработчик команды /start
             self.application.add_handler(CommandHandler("start", self.client_handler.start))
 
             # Обработчик команды /admin
             self.application.add_handler(CommandHandler("admin", self.admin_handler.admin_panel))
 
-            # ConversationHandler для записи на прием
+            # Обработчик команды /stats (метрики для администратора)
+            self.application.add_handler(CommandHandler("stats", self.admin_handler.show_stats))
+
+            # Обработчик команды /find (поиск клиентов для администратора)
+            self.application.add_handler(CommandHandler("find", self.admin_handler.search_clients))
+
+            # Итоги за период и пересчёт статистики (для администратора)
+            self.application.add_handler(CommandHandler("report", self.admin_handler.show_report))
+            self.application.add_handler(CommandHandler("rebuild_stats", self.admin_handler.rebuild_stats))
+
+            # Резервная копия по запросу администратора
+            self.application.add_handler(CommandHandler("backup", self.admin_handler.run_backup))
+
+            # ConversationHandler для записи на прием: вход по кнопке услуги из каталога
             appointment_conv = ConversationHandler(
-                entry_points=[MessageHandler(filters.Regex(r'.+ - \d+ руб\. .+'), self.client_handler.start_appointment)],
+                entry_points=[MessageHandler(ServiceButtonFilter(self.client_handler.menus),
+                                             self.client_handler.start_appointment)],
                 states={
+                    SLOT: [
+                        MessageHandler(filters.Text(['Назад']), self.client_handler.back_from_slots),
+                        MessageHandler(filters.TEXT & ~filters.COMMAND, self.client_handler.choose_slot)
+                    ],
                     PHONE: [MessageHandler(filters.TEXT & ~filters.COMMAND, self.client_handler.get_phone)],
                     NAME: [MessageHandler(filters.TEXT & ~filters.COMMAND, self.client_handler.get_name)],
                 },
-                fallbacks=[CommandHandler("cancel", self.client_handler.cancel)]
+                fallbacks=[
+                    CommandHandler("cancel", self.client_handler.cancel),
+                    CommandHandler("start", self.client_handler.restart)
+                ],
+                name="appointment",
+                persistent=True
             )
             self.application.add_handler(appointment_conv)
 
-            # Обработчики основных кнопок
-            self.application.add_handler(MessageHandler(filters.Regex(r'^(Маникюр|Педикюр|Наращивание)$'),
-                                                      self.client_handler.show_services))
+            self.application.add_handler(CallbackQueryHandler(self.admin_handler.clients_page,
+                                                           pattern=r'^clients:'))
 
-            self.application.add_handler(MessageHandler(filters.Regex(r'^Перейти в телеграм-канал$'),
-                                                      self.client_handler.show_telegram_channel))
+            # Кнопки меню: один обработчик со словарём «текст -> обработчик»
+            router = MessageRouter(self.client_handler.menus, self.client_handler.handle_unknown)
+            router.add_categories(self.client_handler.show_services)
+            router.add('Перейти в телеграм-канал', self.client_handler.show_telegram_channel)
+            router.add('Перейти на сайт', self.client_handler.show_website)
+            router.add('Адрес студии', self.client_handler.show_address)
+            router.add('Назад', self.client_handler.back_to_start)
+            router.add('В главное меню', self.client_handler.start)
 
-            self.application.add_handler(MessageHandler(filters.Regex(r'^Перейти на сайт$'),
-                                                      self.client_handler.show_website))
+            # Административные кнопки
+            router.add('Список клиентов', self.admin_handler.show_clients)
+            router.add('Записи за 30 дней', self.admin_handler.show_appointments)
+            router.add('Клиенты в PDF', self.admin_handler.export_clients_pdf)
+            router.add('Записи в PDF', self.admin_handler.export_appointments_pdf)
 
-            self.application.add_handler(MessageHandler(filters.Regex(r'^Адрес студии$'),
-                                                      self.client_handler.show_address))
-
-            self.application.add_handler(MessageHandler(filters.Regex(r'^Назад$'),
-                                                      self.client_handler.back_to_start))
-
-            # Административные обработчики
-            self.application.add_handler(MessageHandler(filters.Regex(r'^Список клиентов$'),
-                                                      self.admin_handler.show_clients))
-
-            self.application.add_handler(MessageHandler(filters.Regex(r'^Записи за 30 дней$'),
-                                                      self.admin_handler.show_appointments))
-
-            self.application.add_handler(MessageHandler(filters.Regex(r'^В главное меню$'),
-                                                      self.client_handler.start))
-
-            # Обработчик для любых других сообщений
-            self.application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, self.client_handler.handle_unknown))
+            # Неизвестные сообщения уходят в handle_unknown
+            self.application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, router.dispatch))
 
             logger.info("Все обработчики установлены")
 
@@ -79,12 +132,74 @@ class BeautyBot:
             logger.error(f"Ошибка установки обработчиков: {e}")
             raise
 
+    def register_metrics(self):
+        db = get_database()
+        catalog = db.catalog
+        METRICS.gauge('bot_catalog_cache_hits_total', lambda: catalog.hits, kind='counter')
+        METRICS.gauge('bot_catalog_cache_misses_total', lambda: catalog.misses, kind='counter')
+        METRICS.gauge('bot_catalog_cache_loads_total', lambda: catalog.loads, kind='counter')
+        METRICS.gauge('bot_catalog_version', lambda: catalog.version)
+        METRICS.gauge('bot_sessions', lambda: len(self.client_handler.user_states))
+        METRICS.gauge('bot_sessions_memory_bytes', self.client_handler.user_states.memory_usage)
+        METRICS.gauge('bot_active_conversations', lambda: len(self.client_handler.active_bookings))
+        METRICS.gauge('bot_booked_slots', lambda: db.slots.stats()['booked'])
+        METRICS.gauge('bot_throttled_users', lambda: len(self.throttle))
+        METRICS.gauge('bot_admin_notifications_queued', lambda: self.client_handler.notifier.stats()['queued'])
+
+    async def startup(self, application):
+        self.client_handler.notifier.start(application.bot)
+
+        if Config.METRICS_PORT:
+            try:
+                self.metrics_server = await serve_metrics(Config.METRICS_HOST, Config.METRICS_PORT)
+                logger.info(f"Метрики доступны на http://{Config.METRICS_HOST}:{Config.METRICS_PORT}/metrics")
+            except OSError as e:
+                logger.error(f"Не удалось запустить эндпоинт метрик: {e}")
+
+        if self.client_handler.booking_queue:
+            self.client_handler.booking_queue.start()
+            logger.info("Очередь группового коммита записей запущена")
+
+        if Config.BACKUP_INTERVAL_HOURS:
+            self.admin_handler.maintenance.start()
+            logger.info(f"Резервное копирование раз в {Config.BACKUP_INTERVAL_HOURS:g} ч. в {Config.BACKUP_DIR}")
+
+    async def shutdown(self, application):
+        if self.metrics_server:
+            self.metrics_server.close()
+
+        await self.admin_handler.maintenance.stop()
+
+        # Досылаем уведомления администраторам
+        await self.client_handler.notifier.stop()
+
+        # Сохраняем записи из очереди до закрытия соединений
+        if self.client_handler.booking_queue:
+            await self.client_handler.booking_queue.stop()
+
+        # Дожидаемся завершения запросов к БД и останавливаем потоки
+        get_database().close()
+        self.admin_handler.pdf_exporter.close()
+        logger.info("Соединения с базой данных закрыты")
+
     def run(self):
         try:
             self.setup_handlers()
             logger.info("Бот запускается...")
             print("Бот запущен! Для остановки нажмите Ctrl+C")
-            self.application.run_polling()
+            if Config.WEBHOOK_URL:
+                logger.info(f"Режим webhook: {Config.WEBHOOK_LISTEN}:{Config.WEBHOOK_PORT}/{Config.WEBHOOK_PATH}")
+                self.application.run_webhook(
+                    listen=Config.WEBHOOK_LISTEN,
+                    port=Config.WEBHOOK_PORT,
+                    url_path=Config.WEBHOOK_PATH,
+                    webhook_url=f"{Config.WEBHOOK_URL.rstrip('/')}/{Config.WEBHOOK_PATH}",
+                    secret_token=Config.WEBHOOK_SECRET,
+                    cert=Config.WEBHOOK_CERT,
+                    key=Config.WEBHOOK_KEY
+                )
+            else:
+                self.application.run_polling()
         except Exception as e:
             logger.error(f"Ошибка запуска бота: {e}")
             raise
@@ -0,0 +1,103 @@
+import asyncio
+import logging
+import os
+import sqlite3
+from datetime import date, datetime, timedelta
+from database import backup_database
+
+logger = logging.getLogger(__name__)
+
+
+class MaintenanceJob:
+    """Фоновое обслуживание базы: горячие резервные копии и архивация.
+
+    Раз в interval секунд снимает копии основной и архивной баз в
+    backup_dir (хранятся последние keep штук каждой) и, если задан
+    archive_after_days, переносит более старые записи в архивную базу.
+    """
+
+    def __init__(self, db, backup_dir='backups', interval=24 * 3600, keep=7, pages=256, pause=0.01,
+                 archive_path='beauty_bot_archive.db', archive_after_days=0):
+        self.db = db
+        self.backup_dir = backup_dir
+        self.interval = interval
+        self.keep = keep
+        self.pages = pages
+        self.pause = pause
+        self.archive_path = archive_path
+        self.archive_after_days = archive_after_days
+        self.last_backup = None
+        self._lock = asyncio.Lock()
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.get_running_loop().create_task(self._worker())
+
+    async def _worker(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.run()
+            except Exception as e:
+                logger.error(f"Ошибка обслуживания базы: {e}")
+
+    async def run(self):
+        """Резервная копия и архивация; возвращает пути созданных копий."""
+        paths = await self.backup()
+        if self.archive_after_days:
+            await self.archive()
+        return paths
+
+    async def backup(self):
+        # Копии не снимаются параллельно (фоновая и по команде администратора)
+        async with self._lock:
+            os.makedirs(self.backup_dir, exist_ok=True)
+            stamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+            paths = []
+            for source in (self.db.db_name, self.archive_path):
+                if source != self.db.db_name and not os.path.exists(source):
+                    continue
+                name = os.path.splitext(os.path.basename(source))[0]
+                path = os.path.join(self.backup_dir, f"{name}-{stamp}.db")
+                if source == self.db.db_name:
+                    size = await self.db.backup(path, pages=self.pages, pause=self.pause)
+                else:
+                    size = await asyncio.to_thread(self._backup_archive, path)
+                logger.info(f"Резервная копия {path}: {size} байт")
+                self._rotate(name)
+                paths.append(path)
+            self.last_backup = datetime.now()
+            return paths
+
+    def _backup_archive(self, path):
+        # Архив пишется только из archive(), а она не идёт одновременно с копированием
+        conn = sqlite3.connect(self.archive_path)
+        try:
+            return backup_database(conn, path, pages=self.pages, pause=self.pause)
+        finally:
+            conn.close()
+
+    def _rotate(self, name):
+        # Имена копий сортируются по времени создания
+        backups = sorted(
+            entry for entry in os.listdir(self.backup_dir)
+            if entry.startswith(f"{name}-") and entry.endswith('.db')
+        )
+        for entry in backups[:-self.keep]:
+            os.remove(os.path.join(self.backup_dir, entry))
+
+    async def archive(self):
+        before_day = (date.today() - timedelta(days=self.archive_after_days)).isoformat()
+        async with self._lock:
+            appointments, clients = await self.db.archive_appointments(before_day, self.archive_path)
+        if appointments or clients:
+            logger.info(
+                f"В архив {self.archive_path} перенесено записей: {appointments}, клиентов: {clients} "
+                f"(раньше {before_day})"
+            )
+        return appointments, clients
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
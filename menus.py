@@ -0,0 +1,150 @@
+from collections import namedtuple
+from types import MappingProxyType
+from telegram import ReplyKeyboardMarkup
+
+# Статические клавиатуры создаются один раз: объекты telegram неизменяемы
+# и могут переиспользоваться во всех ответах
+ADMIN_START_KEYBOARD = ReplyKeyboardMarkup([['/admin']], resize_keyboard=True)
+ADMIN_PANEL_KEYBOARD = ReplyKeyboardMarkup([
+    ['Список клиентов', 'Записи за 30 дней'],
+    ['Клиенты в PDF', 'Записи в PDF'],
+    ['В главное меню']
+], resize_keyboard=True)
+RESTART_KEYBOARD = ReplyKeyboardMarkup([['/start']], resize_keyboard=True)
+
+WELCOME_TEXT = "Рады Вас видеть в нашей студии маникюра \"Ноготочки-Точка\"!"
+
+# Максимальная длина сообщения Telegram с запасом
+MESSAGE_LIMIT = 4000
+
+
+def chunk_lines(lines, limit=MESSAGE_LIMIT):
+    """Собирает строки в сообщения не длиннее limit, не разрывая строки.
+
+    Строка длиннее limit режется на части отдельно.
+    """
+    chunk = []
+    size = 0
+    for line in lines:
+        while len(line) > limit:
+            if chunk:
+                yield '\n'.join(chunk)
+                chunk, size = [], 0
+            yield line[:limit]
+            line = line[limit:]
+        if chunk and size + len(line) + 1 > limit:
+            yield '\n'.join(chunk)
+            chunk, size = [], 0
+        chunk.append(line)
+        size += len(line) + 1
+    if chunk:
+        yield '\n'.join(chunk)
+
+
+def slot_keyboard(slot_texts, columns=3):
+    """Клавиатура выбора времени: кнопки слотов по columns в ряд и «Назад»."""
+    rows = [list(slot_texts[i:i + columns]) for i in range(0, len(slot_texts), columns)]
+    rows.append(['Назад'])
+    return ReplyKeyboardMarkup(rows, resize_keyboard=True)
+
+
+CategoryMenu = namedtuple('CategoryMenu', ['category_id', 'text', 'keyboard', 'service_map'])
+
+
+class MenuRenderer:
+    """Готовые клавиатуры и тексты меню, построенные по версии каталога.
+
+    Меню пересобираются только при смене версии CatalogCache, в остальное
+    время обработчики получают одни и те же неизменяемые объекты.
+    """
+
+    def __init__(self, catalog):
+        self.catalog = catalog
+        self._version = None
+        self._start_keyboard = None
+        self._category_menus = {}
+        self._service_buttons = {}
+        self._service_texts = frozenset()
+
+    def _ensure_fresh(self):
+        if self._version != self.catalog.version:
+            self._rebuild()
+
+    def _rebuild(self):
+        version = self.catalog.version
+        categories = self.catalog.get_categories()
+
+        category_menus = {}
+        service_buttons = {}  # Текст кнопки услуги -> ID услуги по всем категориям
+        ambiguous = set()  # Одинаковые кнопки разных услуг в разных категориях
+        for category_id, category_name in categories:
+            services = self.catalog.get_services(category_id)
+            keyboard = []
+            service_map = {}  # Соответствие текста кнопки и ID услуги
+            lines = [f"Услуги в категории '{category_name}':\n"]
+
+            for service_id, name, price, duration in services:
+                button_text = f"{name} - {price} руб. ({duration})"
+                keyboard.append([button_text])
+                service_map[button_text] = service_id
+                lines.append(f"• {name} - {price} руб., {duration}")
+
+            for button_text, service_id in service_map.items():
+                if service_buttons.setdefault(button_text, service_id) != service_id:
+                    ambiguous.add(button_text)
+            keyboard.append(['Назад'])
+            category_menus[category_name] = CategoryMenu(
+                category_id=category_id,
+                text='\n'.join(lines) + '\n',
+                keyboard=ReplyKeyboardMarkup(keyboard, resize_keyboard=True) if services else None,
+                service_map=MappingProxyType(service_map)
+            )
+
+        self._start_keyboard = ReplyKeyboardMarkup([
+            [name for _, name in categories],
+            ['Перейти в телеграм-канал', 'Перейти на сайт'],
+            ['Адрес студии']
+        ], resize_keyboard=True)
+        self._category_menus = category_menus
+        self._service_texts = frozenset(service_buttons)
+        for button_text in ambiguous:
+            del service_buttons[button_text]
+        self._service_buttons = service_buttons
+        self._version = version
+
+    @property
+    def version(self):
+        """Версия каталога, по которой построены текущие меню."""
+        self._ensure_fresh()
+        return self._version
+
+    @property
+    def category_names(self):
+        self._ensure_fresh()
+        return list(self._category_menus)
+
+    @property
+    def start_keyboard(self):
+        self._ensure_fresh()
+        return self._start_keyboard
+
+    def get_category_menu(self, category_name):
+        self._ensure_fresh()
+        return self._category_menus.get(category_name)
+
+    def is_service_button(self, button_text):
+        self._ensure_fresh()
+        return button_text in self._service_texts
+
+    def get_service_id(self, button_text, category_name=None):
+        """ID услуги по точному тексту кнопки или None.
+
+        Кнопка ищется в меню категории category_name, открытой пользователем,
+        а без неё (например, после перезапуска) — по всем категориям, где
+        совпадающие кнопки разных категорий не распознаются.
+        """
+        self._ensure_fresh()
+        menu = self._category_menus.get(category_name)
+        if menu and button_text in menu.service_map:
+            return menu.service_map[button_text]
+        return self._service_buttons.get(button_text)
@@ -0,0 +1,182 @@
+import asyncio
+import bisect
+import functools
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Границы корзин гистограмм задержки (сек.)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    """Гистограмма с фиксированными корзинами в формате Prometheus."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q):
+        # Оценка по верхней границе корзины
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float('inf')
+
+
+class Metrics:
+    """Реестр метрик процесса: гистограммы, счётчики и вычисляемые показатели."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}  # (имя, метка) -> Histogram
+        self._counters = {}  # (имя, метка) -> число
+        self._gauges = {}  # имя -> функция без аргументов
+        self._kinds = {}  # имя вычисляемого показателя -> тип ('gauge' или 'counter')
+        self._help = {}  # имя -> (описание, имя метки)
+
+    def describe(self, name, text, label_name=None):
+        self._help[name] = (text, label_name)
+
+    def observe(self, name, label, value):
+        with self._lock:
+            histogram = self._histograms.get((name, label))
+            if histogram is None:
+                histogram = self._histograms[(name, label)] = Histogram()
+            histogram.observe(value)
+
+    def inc(self, name, label, value=1):
+        with self._lock:
+            self._counters[(name, label)] = self._counters.get((name, label), 0) + value
+
+    def gauge(self, name, func, kind='gauge'):
+        """Вычисляемый показатель; kind='counter' — для монотонных счётчиков объекта."""
+        self._gauges[name] = func
+        self._kinds[name] = kind
+
+    def histograms(self, name):
+        with self._lock:
+            return {label: h for (n, label), h in self._histograms.items() if n == name}
+
+    def counters(self, name):
+        with self._lock:
+            return {label: v for (n, label), v in self._counters.items() if n == name}
+
+    def gauges(self):
+        values = {}
+        for name, func in self._gauges.items():
+            try:
+                values[name] = func()
+            except Exception as e:
+                logger.error(f"Error reading gauge {name}: {e}")
+        return values
+
+    def render(self):
+        """Текст в формате Prometheus exposition."""
+        lines = []
+        with self._lock:
+            histograms = sorted(self._histograms.items())
+            counters = sorted(self._counters.items())
+
+        described = set()
+
+        def header(name, kind):
+            if name not in described:
+                described.add(name)
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name][0]}")
+                lines.append(f"# TYPE {name} {kind}")
+
+        def labels(name, label):
+            label_name = self._help.get(name, (None, None))[1] or 'label'
+            return f'{label_name}="{label}"'
+
+        for (name, label), histogram in histograms:
+            header(name, 'histogram')
+            label = labels(name, label)
+            cumulative = 0
+            for bound, count in zip(histogram.buckets, histogram.counts):
+                cumulative += count
+                lines.append(f'{name}_bucket{{{label},le="{bound}"}} {cumulative}')
+            lines.append(f'{name}_bucket{{{label},le="+Inf"}} {histogram.count}')
+            lines.append(f'{name}_sum{{{label}}} {histogram.sum}')
+            lines.append(f'{name}_count{{{label}}} {histogram.count}')
+
+        for (name, label), value in counters:
+            header(name, 'counter')
+            lines.append(f'{name}{{{labels(name, label)}}} {value}')
+
+        for name, value in sorted(self.gauges().items()):
+            header(name, self._kinds.get(name, 'gauge'))
+            lines.append(f'{name} {value}')
+
+        return '\n'.join(lines) + '\n'
+
+
+METRICS = Metrics()
+METRICS.describe('bot_handler_seconds', 'Время выполнения обработчиков бота', 'handler')
+METRICS.describe('bot_db_query_seconds', 'Время выполнения методов Database', 'method')
+METRICS.describe('bot_db_rows_total', 'Количество строк, возвращённых методами Database', 'method')
+METRICS.describe('bot_throttled_updates_total', 'Обновления, отброшенные ограничением частоты', 'kind')
+
+
+def timed_handler(func):
+    """Замеряет время выполнения асинхронного обработчика."""
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await func(*args, **kwargs)
+        finally:
+            METRICS.observe('bot_handler_seconds', func.__name__, time.perf_counter() - started)
+
+    return wrapper
+
+
+def record_query(method, elapsed, result):
+    METRICS.observe('bot_db_query_seconds', method, elapsed)
+    if isinstance(result, list):
+        rows = len(result)
+    else:
+        rows = 0 if result is None else 1
+    METRICS.inc('bot_db_rows_total', method, rows)
+
+
+async def serve_metrics(host, port):
+    """Локальный HTTP-эндпоинт с метриками в текстовом формате Prometheus."""
+
+    async def handle(reader, writer):
+        try:
+            # Читаем заголовки запроса; ответ одинаков для любого пути
+            while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                pass
+            body = METRICS.render().encode('utf-8')
+            writer.write(
+                b'HTTP/1.1 200 OK\r\n'
+                b'Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n'
+                + f'Content-Length: {len(body)}\r\n'.encode()
+                + b'Connection: close\r\n\r\n'
+                + body
+            )
+            await writer.drain()
+        except Exception as e:
+            logger.error(f"Error serving metrics: {e}")
+        finally:
+            writer.close()
+
+    return await asyncio.start_server(handle, host, port)
@@ -0,0 +1,141 @@
+import asyncio
+import heapq
+import itertools
+import logging
+from collections import deque
+from telegram.error import RetryAfter, NetworkError, TimedOut, Forbidden, BadRequest
+
+logger = logging.getLogger(__name__)
+
+
+class AdminNotifier:
+    """Фоновая отправка уведомлений администраторам с учётом лимитов Telegram.
+
+    notify() только ставит сообщения в очередь и сразу возвращается, поэтому
+    не задерживает ответ клиенту. Отправка выдерживает глобальный лимит
+    (global_rate сообщений в секунду) и интервал между сообщениями в один
+    чат, повторяет неудачные попытки с экспоненциальной задержкой и
+    учитывает RetryAfter от Telegram.
+    """
+
+    def __init__(self, admin_ids, global_rate=30, per_chat_interval=1.0,
+                 max_retries=5, base_backoff=1.0, max_size=1000):
+        self.admin_ids = list(admin_ids)
+        self.global_interval = 1 / global_rate
+        self.per_chat_interval = per_chat_interval
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self.max_size = max_size
+        self.bot = None
+        self.sent = 0
+        self.failed = 0
+        self.dropped = 0
+        # Очереди сообщений по чатам [текст, попытка] и куча готовности
+        # чатов (время, порядковый номер, chat_id) — по одной записи на чат
+        self._chats = {}
+        self._heap = []
+        self._seq = itertools.count()
+        self._queued = 0
+        self._wakeup = asyncio.Event()
+        self._next_global = 0.0
+        self._task = None
+
+    def start(self, bot):
+        self.bot = bot
+        self._task = asyncio.get_running_loop().create_task(self._worker())
+
+    def notify_admins(self, text):
+        for admin_id in self.admin_ids:
+            self.notify(admin_id, text)
+
+    def notify(self, chat_id, text):
+        if self._queued >= self.max_size:
+            self.dropped += 1
+            logger.warning(f"Очередь уведомлений переполнена, сообщение для {chat_id} отброшено")
+            return
+
+        self._queued += 1
+        if chat_id in self._chats:
+            self._chats[chat_id].append([text, 0])
+        else:
+            self._chats[chat_id] = deque([[text, 0]])
+            self._schedule(0.0, chat_id)
+
+    def _schedule(self, ready_at, chat_id):
+        heapq.heappush(self._heap, (ready_at, next(self._seq), chat_id))
+        self._wakeup.set()
+
+    async def _worker(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            if not self._heap:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            ready_at, _, chat_id = self._heap[0]
+            wait = max(ready_at, self._next_global) - loop.time()
+            if wait > 0:
+                # Ждём, но просыпаемся раньше, если появился новый чат
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), wait)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            heapq.heappop(self._heap)
+            self._next_global = loop.time() + self.global_interval
+            delay = await self._send(chat_id)
+
+            messages = self._chats[chat_id]
+            if messages:
+                self._schedule(loop.time() + delay, chat_id)
+            else:
+                del self._chats[chat_id]
+
+    async def _send(self, chat_id):
+        """Отправляет первое сообщение чата и возвращает паузу до следующего."""
+        messages = self._chats[chat_id]
+        text, attempt = messages[0]
+        try:
+            await self.bot.send_message(chat_id=chat_id, text=text)
+            self.sent += 1
+        except RetryAfter as e:
+            retry_after = e.retry_after.total_seconds() if hasattr(e.retry_after, 'total_seconds') else e.retry_after
+            logger.warning(f"Telegram просит подождать {retry_after} с перед отправкой в {chat_id}")
+            return retry_after
+        except (Forbidden, BadRequest) as e:
+            # Повтор не поможет: бот заблокирован или неверный chat_id
+            self.failed += 1
+            logger.error(f"Не удалось отправить уведомление в {chat_id}: {e}")
+        except (TimedOut, NetworkError) as e:
+            if attempt + 1 < self.max_retries:
+                # Сообщение остаётся первым в очереди чата, порядок не нарушается
+                messages[0][1] = attempt + 1
+                return self.base_backoff * 2 ** attempt
+            self.failed += 1
+            logger.error(f"Уведомление в {chat_id} не отправлено после {attempt + 1} попыток: {e}")
+        except Exception as e:
+            self.failed += 1
+            logger.error(f"Ошибка отправки уведомления в {chat_id}: {e}")
+
+        messages.popleft()
+        self._queued -= 1
+        return self.per_chat_interval
+
+    async def stop(self, timeout=10):
+        # Даём досылать очередь, но не дольше timeout секунд
+        if not self._task:
+            return
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while self._queued and loop.time() < deadline:
+            await asyncio.sleep(0.1)
+        if self._queued:
+            logger.warning(f"При остановке не отправлено уведомлений: {self._queued}")
+        self._task.cancel()
+        self._task = None
+
+    def stats(self):
+        return {'queued': self._queued, 'sent': self.sent, 'failed': self.failed, 'dropped': self.dropped}
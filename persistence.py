@@ -0,0 +1,113 @@
+import asyncio
+import logging
+from telegram.ext import BasePersistence, PersistenceInput
+from sessions import SessionStore
+
+logger = logging.getLogger(__name__)
+
+
+class SQLitePersistence(BasePersistence):
+    """Хранение user_data и состояний ConversationHandler в базе бота.
+
+    user_data загружается лениво — при первом обновлении от пользователя
+    после старта, а не целиком. Изменения накапливаются и записываются одной
+    транзакцией; PTB передаёт сюда только изменившихся пользователей.
+    Отметки «уже загружен» хранятся в ограниченном SessionStore: после
+    вытеснения данные пользователя просто подгрузятся из базы ещё раз.
+    """
+
+    def __init__(self, db, update_interval=5, max_users=10000, ttl=3600):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=False, callback_data=False),
+            update_interval=update_interval
+        )
+        self.db = db
+        self._loaded_users = SessionStore(max_entries=max_users, ttl=ttl)
+        self._pending_users = {}
+        self._pending_conversations = {}
+        self._flush_task = None
+
+    # Загрузка
+    async def get_user_data(self):
+        # Данные пользователей подгружаются в refresh_user_data
+        return {}
+
+    async def refresh_user_data(self, user_id, user_data):
+        # Несохранённые изменения новее базы: повторно не подгружаем
+        if user_id in self._loaded_users or user_id in self._pending_users:
+            return
+        self._loaded_users.set(user_id, True)
+        stored = await self.db.get_user_state(user_id)
+        if stored:
+            # Свежие значения текущего процесса важнее сохранённых
+            for key, value in stored.items():
+                user_data.setdefault(key, value)
+
+    async def get_conversations(self, name):
+        return await self.db.get_conversation_states(name)
+
+    async def get_chat_data(self):
+        return {}
+
+    async def get_bot_data(self):
+        return {}
+
+    async def get_callback_data(self):
+        return None
+
+    # Сохранение
+    async def update_user_data(self, user_id, data):
+        self._loaded_users.set(user_id, True)
+        self._pending_users[user_id] = data
+        self._schedule_flush()
+
+    async def drop_user_data(self, user_id):
+        self._loaded_users.pop(user_id)
+        self._pending_users[user_id] = None
+        self._schedule_flush()
+
+    async def update_conversation(self, name, key, new_state):
+        self._pending_conversations[(name, key)] = new_state
+        self._schedule_flush()
+
+    def _schedule_flush(self):
+        # Все изменения одного цикла update_persistence уходят одной транзакцией
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.get_running_loop().create_task(self._write_pending())
+
+    async def _write_pending(self):
+        await asyncio.sleep(0)
+        users, self._pending_users = self._pending_users, {}
+        conversations, self._pending_conversations = self._pending_conversations, {}
+        if not users and not conversations:
+            return
+        if not await self.db.save_bot_state(users, conversations):
+            # Вернём изменения в очередь, если за это время их не перезаписали
+            for user_id, data in users.items():
+                self._pending_users.setdefault(user_id, data)
+            for key, state in conversations.items():
+                self._pending_conversations.setdefault(key, state)
+
+    async def flush(self):
+        if self._flush_task:
+            await self._flush_task
+        await self._write_pending()
+
+    # Не используются: chat_data, bot_data и callback_data не хранятся
+    async def update_chat_data(self, chat_id, data):
+        pass
+
+    async def update_bot_data(self, data):
+        pass
+
+    async def update_callback_data(self, data):
+        pass
+
+    async def drop_chat_data(self, chat_id):
+        pass
+
+    async def refresh_chat_data(self, chat_id, chat_data):
+        pass
+
+    async def refresh_bot_data(self, bot_data):
+        pass
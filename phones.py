@@ -0,0 +1,54 @@
+import re
+
+# Код страны для номеров, введённых без него (8 900 ..., 900 ...)
+DEFAULT_COUNTRY_CODE = '7'
+
+_NON_DIGITS = re.compile(r'\D')
+_PHONE_LIKE = re.compile(r'^\+?[\d\s()\-]+$')
+
+
+def normalize_phone(text):
+    """Номер телефона в формате E.164 ('+79001234567') или None.
+
+    Принимает любые разделители: '8 (900) 123-45-67', '+7 900 123 45 67',
+    '9001234567'. Российские номера с 8 в начале или без кода страны
+    приводятся к +7.
+    """
+    if not text:
+        return None
+
+    text = text.strip()
+    digits = _NON_DIGITS.sub('', text)
+
+    if not text.startswith('+'):
+        if len(digits) == 11 and digits[0] == '8':
+            digits = DEFAULT_COUNTRY_CODE + digits[1:]
+        elif len(digits) == 10:
+            digits = DEFAULT_COUNTRY_CODE + digits
+
+    # E.164: до 15 цифр вместе с кодом страны
+    if not 10 <= len(digits) <= 15 or digits[0] == '0':
+        return None
+    return '+' + digits
+
+
+
+def phone_prefix(text):
+    """Начало номера в формате E.164 для поиска по первым цифрам или None.
+
+    Как и при нормализации, '8 900 12' и '900 12' дают '+790012'.
+    None — если текст не похож на номер (есть буквы) или в нём нет цифр.
+    """
+    text = (text or '').strip()
+    if not _PHONE_LIKE.match(text):
+        return None
+
+    digits = _NON_DIGITS.sub('', text)
+    if not digits:
+        return None
+    if not text.startswith('+'):
+        if digits[0] == '8':
+            digits = DEFAULT_COUNTRY_CODE + digits[1:]
+        elif digits[0] == '9':
+            digits = DEFAULT_COUNTRY_CODE + digits
+    return '+' + digits
@@ -0,0 +1,151 @@
+import os
+import asyncio
+import logging
+import sqlite3
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.units import mm
+from reportlab.lib.utils import simpleSplit
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+
+logger = logging.getLogger(__name__)
+
+FONTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fonts')
+
+FONT = 'DejaVuSans'
+FONT_BOLD = 'DejaVuSans-Bold'
+FONT_SIZE = 9
+LINE_HEIGHT = 12
+MARGIN = 15 * mm
+
+# Сколько строк читается из курсора за раз
+FETCH_SIZE = 500
+
+
+def _init_worker():
+    # Шрифты регистрируются один раз на процесс-воркер
+    pdfmetrics.registerFont(TTFont(FONT, os.path.join(FONTS_DIR, 'DejaVuSans.ttf')))
+    pdfmetrics.registerFont(TTFont(FONT_BOLD, os.path.join(FONTS_DIR, 'DejaVuSans-Bold.ttf')))
+
+
+class _PdfWriter:
+    """Построчный вывод текста в PDF с переносом строк и страниц."""
+
+    def __init__(self, path, title):
+        # reportlab держит готовые страницы в памяти до save(), поэтому они сжимаются:
+        # память растёт с размером итогового файла, а строки из базы не копятся
+        self.canvas = canvas.Canvas(path, pagesize=A4, pageCompression=1)
+        self.width, self.height = A4
+        self.y = self.height - MARGIN
+        self.canvas.setTitle(title)
+        self.canvas.setFont(FONT_BOLD, FONT_SIZE + 3)
+        self.canvas.drawString(MARGIN, self.y, title)
+        self.y -= LINE_HEIGHT * 2
+        self.canvas.setFont(FONT, FONT_SIZE)
+
+    def line(self, text, bold=False):
+        font = FONT_BOLD if bold else FONT
+        for part in simpleSplit(text, font, FONT_SIZE, self.width - 2 * MARGIN) or ['']:
+            if self.y < MARGIN:
+                self.canvas.showPage()
+                self.y = self.height - MARGIN
+            self.canvas.setFont(font, FONT_SIZE)
+            self.canvas.drawString(MARGIN, self.y, part)
+            self.y -= LINE_HEIGHT
+
+    def save(self):
+        self.canvas.save()
+
+
+def _rows(db_name, query, params=()):
+    conn = sqlite3.connect(f'file:{db_name}?mode=ro', uri=True)
+    try:
+        cursor = conn.execute(query, params)
+        while True:
+            rows = cursor.fetchmany(FETCH_SIZE)
+            if not rows:
+                break
+            yield from rows
+    finally:
+        conn.close()
+
+
+def render_clients_pdf(db_name, path):
+    writer = _PdfWriter(path, "Список клиентов")
+    count = 0
+    for client_id, name, phone, created_at in _rows(
+        db_name, 'SELECT id, name, phone, created_at FROM clients ORDER BY created_at DESC, id DESC'
+    ):
+        writer.line(f"• ID: {client_id}, Имя: {name}, Телефон: {phone}, Дата: {created_at}")
+        count += 1
+    writer.line("")
+    writer.line(f"Всего клиентов: {count}", bold=True)
+    writer.save()
+    return path
+
+
+def render_appointments_pdf(db_name, path, since):
+    writer = _PdfWriter(path, "Записи за последние 30 дней")
+    count = 0
+    revenue = 0
+    for name, phone, service_name, category_name, price, created_at, starts_at, status in _rows(db_name, '''
+        SELECT c.name, c.phone, s.name, cat.name, COALESCE(a.price, s.price), a.created_at, a.starts_at, a.status
+        FROM appointments a
+        JOIN clients c ON a.client_id = c.id
+        JOIN services s ON a.service_id = s.id
+        JOIN categories cat ON s.category_id = cat.id
+        WHERE a.created_at >= ?
+        ORDER BY a.created_at DESC, a.id DESC
+    ''', (since,)):
+        writer.line(
+            f"• {created_at} — {name}, {phone}: {category_name} / {service_name}, {price} руб."
+            + (f", время {starts_at[:16]}" if starts_at else "")
+            + (", отменена" if status == 'cancelled' else "")
+        )
+        # Отменённые записи показываются, но в итоги не входят (как в daily_stats)
+        if status != 'cancelled':
+            count += 1
+            revenue += price
+    writer.line("")
+    writer.line(f"Всего записей (без отменённых): {count}, выручка: {revenue} руб.", bold=True)
+    writer.save()
+    return path
+
+
+class PdfExporter:
+    """Выгрузка отчётов в PDF в отдельных процессах.
+
+    Вёрстка PDF нагружает процессор, поэтому выполняется в пуле процессов,
+    а не в event loop бота. Воркеры читают базу сами, построчно из курсора.
+    """
+
+    def __init__(self, db_name, max_workers=1):
+        self.db_name = db_name
+        self._executor = ProcessPoolExecutor(
+            max_workers=max_workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker
+        )
+
+    async def _render(self, func, *args):
+        fd, path = tempfile.mkstemp(suffix='.pdf')
+        os.close(fd)
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, func, self.db_name, path, *args)
+        except Exception:
+            os.remove(path)
+            raise
+
+    async def export_clients(self):
+        return await self._render(render_clients_pdf)
+
+    async def export_appointments(self, since):
+        return await self._render(render_appointments_pdf, since)
+
+    def close(self):
+        self._executor.shutdown(wait=True)
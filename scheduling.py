@@ -0,0 +1,171 @@
+import bisect
+import logging
+import re
+import threading
+from datetime import datetime, timedelta
+
+logger = logging.getLogger(__name__)
+
+# Формат времени в колонках starts_at/ends_at (как у created_at)
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+# Длительность услуги, если текст в каталоге не удалось разобрать (мин.)
+DEFAULT_DURATION_MINUTES = 60
+
+WEEKDAYS = ['Пн', 'Вт', 'Ср', 'Чт', 'Пт', 'Сб', 'Вс']
+
+_DURATION_PART = re.compile(r'(\d+(?:[.,]\d+)?)\s*([^\d\s.,]*)')
+
+
+class SlotTakenError(Exception):
+    """Выбранное время уже занято другой записью."""
+
+
+def parse_duration(text):
+    """Длительность услуги в минутах из текста каталога.
+
+    Понимает '30 минут', '2 часа', '1.5 часа', '1,5 ч', '1 час 30 минут'
+    и число без единиц (минуты). Возвращает None, если разобрать не удалось.
+    """
+    parts = _DURATION_PART.findall(text or '')
+    if not parts:
+        return None
+
+    minutes = 0.0
+    for number, unit in parts:
+        value = float(number.replace(',', '.'))
+        unit = unit.lower()
+        if unit.startswith(('ч', 'h')):
+            minutes += value * 60
+        elif unit.startswith(('м', 'min')) or (not unit and len(parts) == 1):
+            minutes += value
+        else:
+            return None
+
+    return int(round(minutes)) or None
+
+
+def format_slot(start):
+    """Текст кнопки слота: 'Пн 20.10 в 10:00'."""
+    return f"{WEEKDAYS[start.weekday()]} {start:%d.%m} в {start:%H:%M}"
+
+
+class SlotIndex:
+    """Интервальный индекс занятого времени мастеров.
+
+    Для каждого мастера хранятся отсортированные списки начал и концов
+    непересекающихся записей, поэтому проверка свободного интервала —
+    один бинарный поиск. Индекс только ускоряет подбор времени: окончательно
+    пересечение проверяется в транзакции записи (Database.book).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._masters = ()
+        self._busy = {}  # master_id -> ([начала], [концы])
+
+    def load(self, masters, intervals):
+        """masters — [(id, имя)], intervals — [(master_id, starts_at, ends_at)]."""
+        busy = {master_id: ([], []) for master_id, _ in masters}
+        for master_id, starts_at, ends_at in sorted(intervals, key=lambda row: (row[0], row[1])):
+            starts, ends = busy.setdefault(master_id, ([], []))
+            starts.append(datetime.strptime(starts_at, TIMESTAMP_FORMAT))
+            ends.append(datetime.strptime(ends_at, TIMESTAMP_FORMAT))
+        with self._lock:
+            self._masters = tuple(masters)
+            self._busy = busy
+
+    @property
+    def masters(self):
+        return self._masters
+
+    def _is_free(self, master_id, start, end):
+        starts, ends = self._busy.get(master_id, ((), ()))
+        # Записи с началом раньше end; свободно, если последняя из них закончилась до start
+        i = bisect.bisect_left(starts, end)
+        return i == 0 or ends[i - 1] <= start
+
+    def is_free(self, master_id, start, end):
+        with self._lock:
+            return self._is_free(master_id, start, end)
+
+    def find_master(self, start, end):
+        """Первый мастер, свободный в [start, end), или None."""
+        with self._lock:
+            for master_id, _ in self._masters:
+                if self._is_free(master_id, start, end):
+                    return master_id
+        return None
+
+    def add(self, master_id, start, end):
+        with self._lock:
+            starts, ends = self._busy.setdefault(master_id, ([], []))
+            i = bisect.bisect_left(starts, start)
+            starts.insert(i, start)
+            ends.insert(i, end)
+
+    def remove(self, master_id, start, end):
+        with self._lock:
+            starts, ends = self._busy.get(master_id, ([], []))
+            i = bisect.bisect_left(starts, start)
+            while i < len(starts) and starts[i] == start:
+                if ends[i] == end:
+                    del starts[i]
+                    del ends[i]
+                    return
+                i += 1
+
+    def stats(self):
+        with self._lock:
+            return {'masters': len(self._masters), 'booked': sum(len(s) for s, _ in self._busy.values())}
+
+
+class Scheduler:
+    """Подбор свободного времени для услуги по рабочим часам студии.
+
+    Кандидаты идут с шагом step минут от открытия в рабочие дни на
+    days_ahead дней вперёд, не раньше чем через lead минут от текущего
+    момента; для каждого проверяется занятость мастеров в SlotIndex.
+    """
+
+    def __init__(self, index, work_start='10:00', work_end='20:00', work_days=(0, 1, 2, 3, 4, 5),
+                 step=30, days_ahead=14, lead=60, clock=datetime.now):
+        self.index = index
+        self.work_start = datetime.strptime(work_start, '%H:%M').time()
+        self.work_end = datetime.strptime(work_end, '%H:%M').time()
+        self.work_days = frozenset(work_days)
+        self.step = timedelta(minutes=step)
+        self.days_ahead = days_ahead
+        self.lead = timedelta(minutes=lead)
+        self.clock = clock
+
+    def is_bookable(self, start):
+        """Можно ли ещё записаться на start: не раньше чем через lead от текущего момента."""
+        return start >= self.clock() + self.lead
+
+    def find_slots(self, minutes, limit=12):
+        """Ближайшие свободные слоты [(начало, master_id)] для услуги длительностью minutes."""
+        duration = timedelta(minutes=minutes)
+        earliest = self.clock() + self.lead
+        slots = []
+
+        for offset in range(self.days_ahead + 1):
+            day = earliest.date() + timedelta(days=offset)
+            if day.weekday() not in self.work_days:
+                continue
+
+            start = datetime.combine(day, self.work_start)
+            close = datetime.combine(day, self.work_end)
+            if start < earliest:
+                # Первый шаг сетки не раньше earliest
+                steps = -((start - earliest) // self.step)
+                start += self.step * steps
+
+            while start + duration <= close:
+                master_id = self.index.find_master(start, start + duration)
+                if master_id is not None:
+                    slots.append((start, master_id))
+                    if len(slots) >= limit:
+                        return slots
+                start += self.step
+
+        return slots
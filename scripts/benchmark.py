@@ -0,0 +1,476 @@
+"""Офлайн-бенчмарк бота на синтетических обновлениях Telegram.
+
+Бот работает целиком (Application, обработчики, БД), но вместо сети
+используется поддельный транспорт: ответы бота перехватываются локально.
+База создаётся во временном каталоге.
+
+Сценарии:
+    flow     N пользователей параллельно проходят start → категория → услуга → время → телефон → имя
+    admin    отчёты администратора на базе заданного размера
+    queries  время основных запросов на базах разного размера
+
+Примеры:
+    python3 scripts/benchmark.py flow --users 200
+    python3 scripts/benchmark.py flow --users 200 --sync-db      # сравнение без потока БД
+    python3 scripts/benchmark.py admin --clients 50000 --appointments 200000
+    python3 scripts/benchmark.py queries --sizes 10000 100000 1000000
+    python3 scripts/benchmark.py queries --drop-indexes                 # те же запросы без индексов
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from concurrent.futures import Executor, Future
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from telegram import Update  # noqa: E402
+from telegram.request import BaseRequest  # noqa: E402
+
+BOT_USER = {'id': 1, 'is_bot': True, 'first_name': 'BeautyBot', 'username': 'beauty_bot'}
+ADMIN_ID = 1000
+FIRST_USER_ID = 100000
+CATEGORIES = ['Маникюр', 'Педикюр', 'Наращивание']
+FIRST_NAMES = ['Анна', 'Мария', 'Елена', 'Ольга', 'Наталья', 'Ирина', 'Светлана', 'Татьяна',
+               'Юлия', 'Екатерина', 'Дарья', 'Алина', 'Ксения', 'Виктория', 'Полина', 'Софья']
+LAST_NAMES = ['Иванова', 'Смирнова', 'Кузнецова', 'Попова', 'Васильева', 'Петрова', 'Соколова',
+              'Михайлова', 'Новикова', 'Фёдорова', 'Морозова', 'Волкова', 'Алексеева', 'Лебедева',
+              'Семёнова', 'Егорова', 'Павлова', 'Козлова', 'Степанова', 'Николаева']
+FLOW_STEPS = ['start', 'category', 'service', 'slot', 'phone', 'name']
+
+
+class FakeRequest(BaseRequest):
+    """Транспорт Bot API без сети: отвечает успехом и запоминает ответы бота по чатам."""
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.requests = 0
+        self._message_ids = itertools.count(1)
+        self._replies = {}
+
+    def replies(self, chat_id):
+        if chat_id not in self._replies:
+            self._replies[chat_id] = asyncio.Queue()
+        return self._replies[chat_id]
+
+    @property
+    def read_timeout(self):
+        return None
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    async def do_request(self, url, method, request_data=None, **kwargs):
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        endpoint = url.rsplit('/', 1)[-1]
+        params = request_data.parameters if request_data else {}
+
+        if endpoint == 'getMe':
+            result = BOT_USER
+        elif endpoint in ('sendMessage', 'sendDocument', 'editMessageText'):
+            chat_id = int(params.get('chat_id', 0))
+            result = {
+                'message_id': next(self._message_ids),
+                'date': int(time.time()),
+                'chat': {'id': chat_id, 'type': 'private'},
+                'from': BOT_USER,
+                'text': params.get('text', '')
+            }
+            self.replies(chat_id).put_nowait(params)
+        else:
+            result = True
+
+        return 200, json.dumps({'ok': True, 'result': result}).encode()
+
+
+class InlineExecutor(Executor):
+    """Выполняет вызовы БД прямо в event loop, как до AsyncDatabase (для сравнения)."""
+
+    def submit(self, fn, *args, **kwargs):
+        future = Future()
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except BaseException as e:
+            future.set_exception(e)
+        return future
+
+
+_update_ids = itertools.count(1)
+
+
+def make_update(bot, user_id, text):
+    message = {
+        'message_id': next(_update_ids),
+        'date': int(time.time()),
+        'chat': {'id': user_id, 'type': 'private'},
+        'from': {'id': user_id, 'is_bot': False, 'first_name': f'user{user_id}'},
+        'text': text
+    }
+    if text.startswith('/'):
+        message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(text.split()[0])}]
+    return Update.de_json({'update_id': message['message_id'], 'message': message}, bot)
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def report(title, latencies, elapsed):
+    count = len(latencies)
+    print(f"{title}: {count} обновлений за {elapsed:.2f} с ({count / elapsed:.1f}/с)")
+    print(f"  задержка ответа: p50 {percentile(latencies, 0.5) * 1000:.1f} мс, "
+          f"p95 {percentile(latencies, 0.95) * 1000:.1f} мс, "
+          f"p99 {percentile(latencies, 0.99) * 1000:.1f} мс, "
+          f"max {max(latencies, default=0) * 1000:.1f} мс")
+
+
+class BotHarness:
+    """Запущенный BeautyBot с поддельным транспортом и временной базой."""
+
+    def __init__(self, workdir, api_latency=0.0, sync_db=False):
+        os.chdir(workdir)
+        from config import Config
+        Config.BOT_TOKEN = Config.BOT_TOKEN or '123456:benchmark'
+        Config.ADMIN_IDS = [ADMIN_ID]
+        Config.METRICS_PORT = 0
+
+        from database import get_database
+        self.db = get_database(os.path.join(workdir, 'benchmark.db'))
+        if sync_db:
+            self.db._executor = InlineExecutor()
+
+        from main import BeautyBot
+        self.request = FakeRequest(api_latency)
+        self.bot = BeautyBot(request=self.request)
+        self.bot.setup_handlers()
+        self.app = self.bot.application
+
+    async def start(self):
+        await self.app.initialize()
+        await self.app.post_init(self.app)
+        await self.app.start()
+
+    async def stop(self):
+        await self.app.stop()
+        await self.app.shutdown()
+        await self.app.post_shutdown(self.app)
+
+    async def send(self, user_id, text, replies=1, timeout=30):
+        """Отправляет сообщение и ждёт replies ответов; возвращает (задержка, ответы)."""
+        queue = self.request.replies(user_id)
+        started = time.perf_counter()
+        await self.app.update_queue.put(make_update(self.app.bot, user_id, text))
+        received = []
+        try:
+            for _ in range(replies):
+                received.append(await asyncio.wait_for(queue.get(), timeout))
+        except asyncio.TimeoutError:
+            pass
+        return time.perf_counter() - started, received
+
+
+def keyboard_buttons(reply):
+    markup = reply.get('reply_markup') or {}
+    return [button['text'] if isinstance(button, dict) else button
+            for row in markup.get('keyboard', []) for button in row]
+
+
+async def run_flow(args):
+    if args.appointments:
+        seed(os.path.join(args.workdir, 'benchmark.db'), max(args.clients, 1), args.appointments)
+    harness = BotHarness(args.workdir, args.api_latency / 1000, sync_db=args.sync_db)
+    await harness.start()
+    latencies = {}
+    retries = []
+
+    async def walk(user_id):
+        buttons = []
+        for step in FLOW_STEPS:
+            if step == 'start':
+                text = '/start'
+            elif step == 'category':
+                text = random.choice(CATEGORIES)
+            elif step in ('service', 'slot'):
+                choices = [button for button in buttons if button != 'Назад']
+                if not choices:
+                    return
+                text = random.choice(choices)
+            elif step == 'phone':
+                text = f'+7900{user_id:07d}'
+            else:
+                text = f'Клиент {user_id}'
+
+            latency, replies = await harness.send(user_id, text)
+            latencies.setdefault(step, []).append(latency)
+            if replies:
+                buttons = keyboard_buttons(replies[-1])
+            if step == 'slot' and buttons:
+                # Постоянный клиент: запись создана сразу после выбора времени
+                # либо время заняли и предложено другое
+                break
+
+        # Время заняли параллельно: бот предлагает другое, выбираем снова
+        for _ in range(20):
+            choices = [button for button in buttons if button not in ('Назад', '/start')]
+            if not choices:
+                return
+            retries.append(user_id)
+            latency, replies = await harness.send(user_id, random.choice(choices))
+            latencies.setdefault('retry', []).append(latency)
+            buttons = keyboard_buttons(replies[-1]) if replies else []
+
+    async def walk_rounds(user_id):
+        for _ in range(args.rounds):
+            await walk(user_id)
+
+    spam_replies = []
+
+    async def spam(user_id):
+        # Флуд без ожидания ответов: всё, что прошло ограничение, даёт ответ
+        queue = harness.request.replies(user_id)
+        for i in range(args.spam_messages):
+            await harness.app.update_queue.put(make_update(harness.app.bot, user_id, f'спам {i}'))
+            await asyncio.sleep(0)
+        await asyncio.sleep(0.5)
+        spam_replies.append(queue.qsize())
+
+    admin_latencies = []
+    flow_done = asyncio.Event()
+
+    async def admin_reports():
+        # Отчёт администратора параллельно с записью клиентов
+        queue = harness.request.replies(ADMIN_ID)
+        while not flow_done.is_set():
+            # Хвост многостраничного ответа не должен засчитываться следующему запросу
+            while not queue.empty():
+                queue.get_nowait()
+            latency, _ = await harness.send(ADMIN_ID, 'Записи за 30 дней')
+            admin_latencies.append(latency)
+
+    # Пользователи бенчмарка нажимают кнопки быстрее людей: ограничение
+    # частоты к ним не применяется, только к флудящим
+    harness.bot.throttle.exempt |= {FIRST_USER_ID + i for i in range(args.users)}
+    spammers = range(FIRST_USER_ID + args.users, FIRST_USER_ID + args.users + args.spammers)
+
+    async def clients():
+        await asyncio.gather(*(walk_rounds(FIRST_USER_ID + i) for i in range(args.users)),
+                             *(spam(user_id) for user_id in spammers))
+        flow_done.set()
+
+    started = time.perf_counter()
+    await asyncio.gather(clients(), *([admin_reports()] if args.admin_reports else []))
+    elapsed = time.perf_counter() - started
+
+    bookings = (await harness.db.get_daily_stats('0000-00-00', '9999-12-31'))['total']['count'] - args.appointments
+    await harness.stop()
+
+    report(f"Поток записи, {args.users} пользователей",
+           [value for values in latencies.values() for value in values], elapsed)
+    for step in FLOW_STEPS + ['retry']:
+        values = latencies.get(step, [])
+        print(f"  {step}: {len(values)} шт., p50 {percentile(values, 0.5) * 1000:.1f} мс, "
+              f"p99 {percentile(values, 0.99) * 1000:.1f} мс")
+    print(f"  завершённых записей: {bookings} из {args.users * args.rounds}, повторных выборов времени: {len(retries)}, "
+          f"запросов к Bot API: {harness.request.requests}")
+    if admin_latencies:
+        print(f"  отчёты администратора: {len(admin_latencies)} шт., "
+              f"p50 {percentile(admin_latencies, 0.5) * 1000:.1f} мс")
+    if args.spammers:
+        print(f"  флуд: {args.spammers} × {args.spam_messages} сообщений, ответов: {sum(spam_replies)}, "
+              f"отброшено: {harness.bot.throttle.dropped}")
+
+
+def seed(db_path, clients, appointments, days=60):
+    """Быстро наполняет базу синтетическими клиентами и записями."""
+    from database import Database
+    Database(db_path).close()
+
+    conn = sqlite3.connect(db_path)
+    now = datetime.now()
+    service_ids = [row[0] for row in conn.execute('SELECT id FROM services')]
+
+    def timestamp(i, total):
+        return (now - timedelta(seconds=days * 86400 * (total - i) / total)).strftime('%Y-%m-%d %H:%M:%S')
+
+    conn.executemany(
+        'INSERT INTO clients (name, phone, created_at) VALUES (?, ?, ?)',
+        ((f'{random.choice(FIRST_NAMES)} {random.choice(LAST_NAMES)}', f'+79{i:09d}', timestamp(i, clients))
+         for i in range(clients))
+    )
+    conn.executemany(
+        'INSERT INTO appointments (client_id, service_id, created_at) VALUES (?, ?, ?)',
+        ((random.randint(1, clients), random.choice(service_ids), timestamp(i, appointments))
+         for i in range(appointments))
+    )
+    conn.commit()
+    conn.close()
+
+
+async def run_admin(args):
+    from database import days_ago
+    started = time.perf_counter()
+    seed(os.path.join(args.workdir, 'benchmark.db'), args.clients, args.appointments)
+    print(f"База: {args.clients} клиентов, {args.appointments} записей (создана за {time.perf_counter() - started:.1f} с)")
+
+    harness = BotHarness(args.workdir, args.api_latency / 1000)
+    await harness.start()
+
+    for text, replies in (('Список клиентов', 1), ('Записи за 30 дней', 1), ('/find Мария', 1),
+                          (f'/report {days_ago(60)[:10]} {days_ago(0)[:10]}', 1), ('/stats', 1)):
+        first = []
+        for _ in range(args.repeat):
+            latency, _ = await harness.send(ADMIN_ID, text, replies=replies)
+            first.append(latency)
+        # Дожидаемся хвоста многостраничных ответов перед следующим замером
+        await asyncio.sleep(0.5)
+        queue = harness.request.replies(ADMIN_ID)
+        while not queue.empty():
+            queue.get_nowait()
+        print(f"{text}: первый ответ p50 {percentile(first, 0.5) * 1000:.1f} мс, "
+              f"max {max(first) * 1000:.1f} мс ({args.repeat} повторов)")
+
+    await harness.stop()
+
+
+def fill_schedule(db, scheduler, count):
+    """Занимает count ближайших слотов, чтобы индекс расписания был непустым."""
+    service_id = db.catalog.get_services(db.catalog.get_categories()[0][0])[0][0]
+    minutes = db.catalog.get_duration(service_id)
+    booked = 0
+    while booked < count:
+        slots = scheduler.find_slots(minutes, limit=1)
+        if not slots or not db.book(f'Клиент слота {booked}', f'+7999{booked:07d}', service_id, slots[0][::-1]):
+            break
+        booked += 1
+    return booked
+
+
+# Неуникальные индексы, на которые опираются замеряемые запросы; уникальные
+# нужны для ON CONFLICT при записи и не удаляются
+QUERY_INDEXES = ('idx_clients_created_at', 'idx_appointments_created_at', 'idx_services_category_id',
+                 'idx_appointments_client_id')
+
+
+def services_by_category(db, category_id):
+    with db.read() as conn:
+        return conn.execute('SELECT id, name, price, duration FROM services WHERE category_id = ?',
+                            (category_id,)).fetchall()
+
+
+def run_queries(args):
+    from database import Database, days_ago
+    from scheduling import Scheduler
+
+    for size in args.sizes:
+        db_path = os.path.join(args.workdir, f'queries_{size}.db')
+        started = time.perf_counter()
+        seed(db_path, max(1, size // 5), size)
+        seeded = time.perf_counter() - started
+
+        db = Database(db_path)
+        scheduler = Scheduler(db.slots, days_ahead=60)
+        booked = fill_schedule(db, scheduler, args.booked_slots)
+        if args.drop_indexes:
+            with db.write() as conn:
+                for index in QUERY_INDEXES:
+                    conn.execute(f'DROP INDEX IF EXISTS {index}')
+        with db.read() as conn:
+            # Ключ страницы из середины списка клиентов — «глубокое» листание
+            middle = conn.execute('''
+                SELECT created_at, id FROM clients ORDER BY created_at DESC, id DESC LIMIT 1 OFFSET ?
+            ''', (size // 10,)).fetchone()
+        middle = (middle['created_at'], middle['id'])
+        since = days_ago(30)
+        timings = {}
+        for name, query in (
+            ('find_slots', lambda: scheduler.find_slots(60, limit=12)),
+            ('search_clients (имя)', lambda: db.search_clients('Анна Иван')),
+            ('search_clients (телефон)', lambda: db.search_clients('8900001')),
+            ('get_clients_page (первая)', lambda: db.get_clients_page(limit=20)),
+            ('get_clients_page (середина)', lambda: db.get_clients_page(after=middle, limit=20)),
+            ('get_clients_page (назад)', lambda: db.get_clients_page(before=middle, limit=20)),
+            ('get_appointments_last_30_days', db.get_appointments_last_30_days),
+            ('get_appointments_chunk', lambda: db.get_appointments_chunk(since, limit=200)),
+            ('get_daily_stats (30 дней)', lambda: db.get_daily_stats(since[:10], '9999-12-31')),
+            ('get_daily_stats (год)', lambda: db.get_daily_stats(days_ago(365)[:10], '9999-12-31')),
+            ('get_services_by_category', lambda: db.get_services_by_category(1)),
+            # Тот же запрос в обход кэша каталога — так он выполняется при перезагрузке каталога
+            ('get_services_by_category (SQL)', lambda: services_by_category(db, 1)),
+        ):
+            samples = []
+            for _ in range(args.repeat):
+                t = time.perf_counter()
+                query()
+                samples.append(time.perf_counter() - t)
+            timings[name] = percentile(samples, 0.5)
+        db.close()
+
+        indexes = 'без индексов' if args.drop_indexes else 'с индексами'
+        print(f"{size} записей, {booked} занятых слотов, {indexes} (база создана за {seeded:.1f} с):")
+        for name, value in timings.items():
+            print(f"  {name}: {value * 1000:.2f} мс")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workdir', help='Каталог для временной базы (по умолчанию — новый временный)')
+    parser.add_argument('--api-latency', type=float, default=0.0, help='Задержка поддельного Bot API, мс')
+    parser.add_argument('--seed', type=int, default=1)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    flow = commands.add_parser('flow', help='параллельные пользователи проходят запись')
+    flow.add_argument('--users', type=int, default=100)
+    flow.add_argument('--rounds', type=int, default=1, help='Сколько раз каждый пользователь проходит запись')
+    flow.add_argument('--sync-db', action='store_true',
+                      help='Вызовы БД в event loop без потока (поведение до AsyncDatabase)')
+    flow.add_argument('--admin-reports', action='store_true', help='Администратор параллельно запрашивает отчёт за 30 дней')
+    flow.add_argument('--clients', type=int, default=0, help='Клиентов в базе до начала (с --appointments)')
+    flow.add_argument('--appointments', type=int, default=0, help='Записей в базе до начала')
+    flow.add_argument('--spammers', type=int, default=0, help='Сколько пользователей параллельно флудят')
+    flow.add_argument('--spam-messages', type=int, default=200, help='Сообщений от каждого флудящего')
+
+    admin = commands.add_parser('admin', help='отчёты администратора')
+    admin.add_argument('--clients', type=int, default=10000)
+    admin.add_argument('--appointments', type=int, default=50000)
+    admin.add_argument('--repeat', type=int, default=5)
+
+    queries = commands.add_parser('queries', help='время запросов на базах разного размера')
+    queries.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+    queries.add_argument('--repeat', type=int, default=20)
+    queries.add_argument('--booked-slots', type=int, default=500, help='Сколько ближайших слотов занять заранее')
+    queries.add_argument('--drop-indexes', action='store_true',
+                         help='Удалить индексы запросов перед замером (сравнение «до/после»)')
+
+    args = parser.parse_args()
+    random.seed(args.seed)
+    args.workdir = os.path.abspath(args.workdir or tempfile.mkdtemp(prefix='beautybot-bench-'))
+    os.makedirs(args.workdir, exist_ok=True)
+    print(f"Рабочий каталог: {args.workdir}")
+
+    if args.command == 'flow':
+        asyncio.run(run_flow(args))
+    elif args.command == 'admin':
+        asyncio.run(run_admin(args))
+    else:
+        run_queries(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""Отправка поддельных обновлений Telegram в webhook бота.
+
+Имитирует сервер Telegram: для каждого из N пользователей последовательно
+отправляет сообщения сценария на локальный webhook и печатает время ответа.
+
+Пример:
+    python3 scripts/fake_updates.py --url http://127.0.0.1:8443/telegram --users 20
+"""
+import argparse
+import asyncio
+import itertools
+import time
+import httpx
+
+SCENARIO = ['/start', 'Маникюр', 'Назад']
+
+_update_ids = itertools.count(1)
+
+
+def make_update(user_id, text):
+    message = {
+        'message_id': next(_update_ids),
+        'date': int(time.time()),
+        'chat': {'id': user_id, 'type': 'private'},
+        'from': {'id': user_id, 'is_bot': False, 'first_name': f'user{user_id}'},
+        'text': text
+    }
+    if text.startswith('/'):
+        message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(text)}]
+    return {'update_id': message['message_id'], 'message': message}
+
+
+async def walk(client, url, headers, user_id, scenario, timings):
+    for text in scenario:
+        started = time.perf_counter()
+        response = await client.post(url, json=make_update(user_id, text), headers=headers)
+        timings.append(time.perf_counter() - started)
+        response.raise_for_status()
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', default='http://127.0.0.1:8443/telegram')
+    parser.add_argument('--secret', default='', help='WEBHOOK_SECRET бота')
+    parser.add_argument('--users', type=int, default=10)
+    parser.add_argument('--first-user-id', type=int, default=100000)
+    parser.add_argument('--text', action='append', help='Сообщения сценария (можно несколько)')
+    args = parser.parse_args()
+
+    headers = {'X-Telegram-Bot-Api-Secret-Token': args.secret} if args.secret else {}
+    scenario = args.text or SCENARIO
+    timings = []
+
+    started = time.perf_counter()
+    async with httpx.AsyncClient() as client:
+        await asyncio.gather(*(
+            walk(client, args.url, headers, args.first_user_id + i, scenario, timings)
+            for i in range(args.users)
+        ))
+    elapsed = time.perf_counter() - started
+
+    timings.sort()
+    print(f"Обновлений: {len(timings)} за {elapsed:.2f} с ({len(timings) / elapsed:.1f}/с)")
+    print(f"Ответ webhook: p50 {timings[len(timings) // 2] * 1000:.1f} мс, "
+          f"max {timings[-1] * 1000:.1f} мс")
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
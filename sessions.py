@@ -0,0 +1,74 @@
+import sys
+import time
+from collections import OrderedDict
+
+
+class SessionStore:
+    """Ограниченное хранилище состояний пользователей с вытеснением LRU и TTL.
+
+    Записи упорядочены по времени последнего обращения, поэтому устаревшие
+    всегда лежат в начале и удаляются без полного обхода. Значения не
+    копируются: храним ссылки на общие объекты (например, service_map меню).
+    """
+
+    def __init__(self, max_entries=10000, ttl=3600, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._clock = clock
+        self._entries = OrderedDict()
+        self.evictions = 0
+        self.expirations = 0
+
+    def _purge_expired(self, now):
+        while self._entries:
+            key, (_, expires_at) = next(iter(self._entries.items()))
+            if expires_at > now:
+                break
+            del self._entries[key]
+            self.expirations += 1
+
+    def get(self, key, default=None):
+        now = self._clock()
+        self._purge_expired(now)
+        entry = self._entries.get(key)
+        if entry is None:
+            return default
+        # Обращение продлевает жизнь записи
+        self._entries[key] = (entry[0], now + self.ttl)
+        self._entries.move_to_end(key)
+        return entry[0]
+
+    def set(self, key, value):
+        now = self._clock()
+        self._purge_expired(now)
+        self._entries[key] = (value, now + self.ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def pop(self, key, default=None):
+        entry = self._entries.pop(key, None)
+        return entry[0] if entry is not None else default
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def __len__(self):
+        return len(self._entries)
+
+    def memory_usage(self):
+        # Приблизительно: сам словарь, ключи и кортежи записей без общих значений
+        size = sys.getsizeof(self._entries)
+        for key, entry in self._entries.items():
+            size += sys.getsizeof(key) + sys.getsizeof(entry) + sys.getsizeof(entry[1])
+        return size
+
+    def stats(self):
+        return {
+            'entries': len(self._entries),
+            'max_entries': self.max_entries,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+            'memory_bytes': self.memory_usage()
+        }
@@ -0,0 +1,15 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+@pytest.fixture
+def db(tmp_path):
+    from database import Database
+    database = Database(str(tmp_path / 'test.db'), readers=1)
+    yield database
+    database.close()
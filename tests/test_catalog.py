@@ -0,0 +1,26 @@
+from metrics import Metrics
+
+
+def test_cache_counts_lookups_not_reloads(db):
+    catalog = db.catalog
+    loads, hits, misses = catalog.loads, catalog.hits, catalog.misses
+
+    assert catalog.get_service(1) is not None
+    assert catalog.get_service(10 ** 6) is None
+    assert catalog.get_category_id('Нет такой') is None
+    assert catalog.get_services(10 ** 6) == []
+    assert catalog.get_duration(10 ** 6) == 60
+    assert (catalog.hits - hits, catalog.misses - misses) == (1, 4)
+
+    db.update_service(1, 'Классический', 1600.0, '3 часа')
+    assert catalog.loads == loads + 1
+    assert catalog.misses - misses == 4
+
+
+def test_callback_counter_is_rendered_as_counter():
+    metrics = Metrics()
+    metrics.gauge('cache_loads_total', lambda: 3, kind='counter')
+    metrics.gauge('sessions', lambda: 5)
+    text = metrics.render()
+    assert '# TYPE cache_loads_total counter\ncache_loads_total 3' in text
+    assert '# TYPE sessions gauge\nsessions 5' in text
@@ -0,0 +1,198 @@
+import sqlite3
+from datetime import datetime, timedelta
+
+import pytest
+
+from scheduling import SlotTakenError
+
+
+def _slot(hours):
+    start = (datetime.now() + timedelta(days=2)).replace(hour=10, minute=0, second=0, microsecond=0)
+    return 1, start + timedelta(hours=hours)
+
+
+def test_book_many_commits_batch_once(db):
+    statements = []
+    db.pool._writer.set_trace_callback(statements.append)
+    bookings = [(f'Клиент {i}', f'+7900000000{i}', 4, _slot(i)) for i in range(5)]
+    # Шестая запись — на занятое время: откатывается только её точка сохранения
+    bookings.append(('Клиент 5', '+79000000005', 4, _slot(0)))
+
+    results = db.book_many(bookings)
+    db.pool._writer.set_trace_callback(None)
+
+    assert all(result and not isinstance(result, SlotTakenError) for result in results[:5])
+    assert isinstance(results[5], SlotTakenError)
+    assert statements.count('BEGIN') == 1
+    assert statements.count('COMMIT') == 1
+    assert statements.index('BEGIN') < statements.index('SAVEPOINT booking')
+    assert not db.pool._writer.in_transaction
+
+
+def test_failed_migration_is_rolled_back(tmp_path, monkeypatch):
+    from database import Database
+    path = str(tmp_path / 'migrate.db')
+    Database(path, readers=1).close()
+    conn = sqlite3.connect(path)
+    version = conn.execute('PRAGMA user_version').fetchone()[0]
+    conn.close()
+
+    def broken(cursor):
+        cursor.execute('ALTER TABLE clients ADD COLUMN note TEXT')
+        raise RuntimeError('merge failed')
+
+    migrations = Database._migrations
+    monkeypatch.setattr(Database, '_migrations', lambda self: migrations(self) + [(version + 1, broken)])
+
+    # Повторный запуск падает на той же миграции, а не на «duplicate column name»
+    for _ in range(2):
+        with pytest.raises(RuntimeError, match='merge failed'):
+            Database(path, readers=1)
+
+    conn = sqlite3.connect(path)
+    assert 'note' not in [row[1] for row in conn.execute('PRAGMA table_info(clients)')]
+    assert conn.execute('PRAGMA user_version').fetchone()[0] == version
+    conn.close()
+
+
+def test_overlap_with_long_earlier_booking(db):
+    # Гель-лак (5 часов) с 10:00 пересекается с записью на 14:00
+    gel = next(s[0] for s in db.get_services_by_category(db.get_category_id('Маникюр')) if s[1] == 'Гель-лак')
+    db.book('Анна', '+79000000001', gel, _slot(0))
+    with pytest.raises(SlotTakenError):
+        db.book('Мария', '+79000000002', 4, _slot(4))
+    assert db.book('Мария', '+79000000002', 4, _slot(5))
+
+
+def test_overlap_query_is_bounded_by_longest_booking(db):
+    statements = []
+    db.pool._writer.set_trace_callback(statements.append)
+    master_id, start = _slot(0)
+    db.book('Анна', '+79000000001', 4, (master_id, start))
+    db.pool._writer.set_trace_callback(None)
+
+    query = next(sql for sql in statements if 'SELECT 1 FROM appointments' in sql)
+    earliest = (start - timedelta(minutes=db._longest_booking)).strftime('%Y-%m-%d %H:%M:%S')
+    assert f"starts_at > '{earliest}'" in query
+
+
+def _stats(db):
+    with db.read() as conn:
+        return [tuple(row) for row in conn.execute('SELECT service_id, bookings, revenue FROM daily_stats')]
+
+
+def test_cancel_after_price_change_uses_booking_price(db):
+    _, first, _ = db.book('Анна', '+79000000001', 1)
+    db.book('Мария', '+79000000002', 1)
+    db.update_service(1, 'Классический', 3000.0, '3 часа')
+    db.book('Ольга', '+79000000003', 1)
+    assert _stats(db) == [(1, 3, 6000.0)]
+
+    assert db.cancel_appointment(first)
+    assert _stats(db) == [(1, 2, 4500.0)]
+
+    # Пересчёт даёт те же итоги: цена берётся из записи, а не из прайса
+    assert db.rebuild_daily_stats()
+    assert _stats(db) == [(1, 2, 4500.0)]
+
+
+def test_listing_matches_daily_stats(db):
+    from database import days_ago
+    for i in range(4):
+        db.book(f'Клиент {i}', f'+7900000000{i}', 4)
+    db.cancel_appointment(1)
+    # Запись в начале первого дня периода: входит и в итоги, и в список
+    since = days_ago(30)[:10]
+    with db.write() as conn:
+        conn.execute("UPDATE appointments SET created_at = ? WHERE id = 2", (since + ' 00:00:01',))
+    db.rebuild_daily_stats()
+
+    summary = db.get_daily_stats(since, datetime.now().strftime('%Y-%m-%d'))
+    rows = db.get_appointments_chunk(since, limit=100)
+    active = [row for row in rows if row['status'] != 'cancelled']
+    assert len(rows) == 4
+    assert summary['total']['count'] == len(active) == 3
+    assert summary['total']['revenue'] == sum(row['price'] for row in active)
+
+
+def test_book_and_cancel_without_returning(db):
+    # RETURNING требует SQLite 3.35+, а в Ubuntu 20.04 и Debian 11 версия старше
+    statements = []
+    db.pool._writer.set_trace_callback(statements.append)
+    client_id = db.add_client('Анна', '+79990000001')
+    assert db.add_client('Анна Петрова', '+79990000001') == client_id
+    booked_client_id, appointment_id, _ = db.book('Анна', '+79990000001', 4, _slot(0))
+    assert booked_client_id == client_id
+    assert db.cancel_appointment(appointment_id)
+    assert not db.cancel_appointment(appointment_id)
+    db.pool._writer.set_trace_callback(None)
+    assert not any('RETURNING' in sql.upper() for sql in statements)
+
+
+def test_duplicate_clients_merge_keeps_latest_name(tmp_path, monkeypatch):
+    from database import Database
+    path = str(tmp_path / 'legacy.db')
+    # База версии 0: только исходные таблицы, дубли ещё не слиты
+    with monkeypatch.context() as patch:
+        for name in ('_migrations', 'load_catalog', 'load_schedule'):
+            patch.setattr(Database, name, lambda self: [])
+        Database(path, readers=1).close()
+    conn = sqlite3.connect(path)
+    conn.executemany('INSERT INTO clients (name, phone) VALUES (?, ?)', [
+        ('Анна', '+79001112233'),
+        ('Анна Петрова', '+79001112233'),
+        ('', '8 900 111-22-33'),
+    ])
+    conn.executemany('INSERT INTO appointments (client_id, service_id) VALUES (?, 1)', [(i,) for i in range(1, 4)])
+    conn.commit()
+    conn.close()
+
+    db = Database(path, readers=1)
+    try:
+        with db.read() as conn:
+            clients = [tuple(row) for row in conn.execute('SELECT id, name, phone FROM clients')]
+            owners = {row[0] for row in conn.execute('SELECT client_id FROM appointments')}
+        # Версии 1 и 6 сливают по одному правилу: самый ранний id, последнее непустое имя
+        assert clients == [(1, 'Анна Петрова', '+79001112233')]
+        assert owners == {1}
+    finally:
+        db.close()
+
+
+def test_archive_keeps_future_bookings_and_telegram_clients(db, tmp_path):
+    _, past, _ = db.book('Анна', '+79000000001', 4, _slot(0))
+    _, future, _ = db.book('Мария', '+79000000002', 4, _slot(2), user_id=1002)
+    db.add_client('Ольга', '+79000000003', user_id=1003)
+    db.add_client('Ирина', '+79000000004')
+    with db.write() as conn:
+        # Все созданы давно; прошёл только визит первой записи
+        conn.execute("UPDATE appointments SET created_at = '2000-01-01 10:00:00'")
+        conn.execute("UPDATE clients SET created_at = '2000-01-01 10:00:00'")
+        conn.execute("""
+            UPDATE appointments SET starts_at = '2000-01-02 10:00:00', ends_at = '2000-01-02 11:00:00'
+            WHERE id = ?
+        """, (past,))
+
+    today = datetime.now().strftime('%Y-%m-%d')
+    assert db.archive_appointments(today, str(tmp_path / 'archive.db')) == (1, 2)
+
+    with db.read() as conn:
+        assert [row['id'] for row in conn.execute('SELECT id FROM appointments')] == [future]
+        names = [row['name'] for row in conn.execute('SELECT name FROM clients ORDER BY id')]
+    assert names == ['Мария', 'Ольга']
+    # Время будущей записи по-прежнему занято, в том числе после перезагрузки расписания
+    db.load_schedule()
+    with pytest.raises(SlotTakenError):
+        db.book('Ирина', '+79000000004', 4, _slot(2))
+
+
+def test_archive_detaches_when_setup_fails(db, tmp_path):
+    # Архив с чужой схемой: ATTACH проходит, создание индекса падает
+    broken = str(tmp_path / 'broken.db')
+    conn = sqlite3.connect(broken)
+    conn.execute('CREATE TABLE appointments (id INTEGER PRIMARY KEY)')
+    conn.close()
+    with pytest.raises(sqlite3.OperationalError):
+        db.archive_appointments('2000-01-01', broken)
+    with db.write() as conn:
+        assert [row['name'] for row in conn.execute('PRAGMA database_list')] == ['main']
@@ -0,0 +1,56 @@
+import asyncio
+from datetime import datetime, timezone
+
+from telegram import Chat, Message, Update, User
+
+from dispatch import PerChatUpdateProcessor
+
+
+def _update(update_id, chat_id):
+    message = Message(
+        update_id, datetime.now(timezone.utc), Chat(chat_id, Chat.PRIVATE),
+        from_user=User(chat_id, 'user', False), text='text'
+    )
+    return Update(update_id, message=message)
+
+
+def test_busy_chat_does_not_take_all_slots():
+    async def scenario():
+        processor = PerChatUpdateProcessor(8)
+        order = []
+
+        async def handle(chat_id, n):
+            await asyncio.sleep(0.05)
+            order.append((chat_id, n))
+
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        busy = [asyncio.create_task(processor.process_update(_update(i, 1), handle(1, i))) for i in range(20)]
+        await asyncio.sleep(0)
+        await processor.process_update(_update(100, 2), handle(2, 0))
+        other_chat = loop.time() - started
+        await asyncio.gather(*busy)
+        return order, other_chat
+
+    order, other_chat = asyncio.run(scenario())
+    # Очередь чата 1 (20 × 50 мс) не задерживает чат 2 дольше одного обновления
+    assert other_chat < 0.2
+    assert [n for chat_id, n in order if chat_id == 1] == list(range(20))
+
+
+def test_limit_applies_to_running_updates():
+    async def scenario():
+        processor = PerChatUpdateProcessor(2)
+        running = peak = 0
+
+        async def handle():
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+
+        await asyncio.gather(*(processor.process_update(_update(i, i), handle()) for i in range(10)))
+        return peak
+
+    assert asyncio.run(scenario()) == 2
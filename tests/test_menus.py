@@ -0,0 +1,20 @@
+from menus import MenuRenderer
+
+
+def test_same_button_in_two_categories(db):
+    manicure = db.get_category_id('Маникюр')
+    pedicure = db.get_category_id('Педикюр')
+    classic = next(s[0] for s in db.get_services_by_category(manicure) if s[1] == 'Классический')
+    same = db.add_service(pedicure, 'Классический', 1500.0, '3 часа')
+    menus = MenuRenderer(db.catalog)
+    button = 'Классический - 1500.0 руб. (3 часа)'
+
+    assert menus.is_service_button(button)
+    assert menus.get_service_id(button, 'Маникюр') == classic
+    assert menus.get_service_id(button, 'Педикюр') == same
+    # Без открытой категории кнопка неоднозначна и не угадывается
+    assert menus.get_service_id(button) is None
+
+    unique = next(text for text, _ in menus.get_category_menu('Наращивание').service_map.items())
+    assert menus.get_service_id(unique) is not None
+    assert menus.get_service_id(unique, 'Маникюр') == menus.get_service_id(unique)
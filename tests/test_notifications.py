@@ -0,0 +1,99 @@
+import asyncio
+from datetime import timedelta
+
+from telegram.error import RetryAfter, TimedOut
+
+from notifications import AdminNotifier
+
+# Погрешность таймеров event loop
+TOLERANCE = 0.005
+
+
+class RateLimitedBot:
+    """Поддельный бот с лимитами Telegram: при превышении отвечает RetryAfter."""
+
+    def __init__(self, global_interval, per_chat_interval, retry_after=0.05, failures=None):
+        self.global_interval = global_interval
+        self.per_chat_interval = per_chat_interval
+        self.retry_after = retry_after
+        # chat_id -> сколько первых попыток завершить TimedOut
+        self.failures = dict(failures or {})
+        self.delivered = []  # (время, chat_id, текст)
+        self.rate_limited = 0
+        self.attempts = 0
+
+    async def send_message(self, chat_id, text):
+        now = asyncio.get_running_loop().time()
+        self.attempts += 1
+        last_global = self.delivered[-1][0] if self.delivered else None
+        last_chat = next((t for t, c, _ in reversed(self.delivered) if c == chat_id), None)
+        if (last_global is not None and now - last_global < self.global_interval - TOLERANCE) or \
+                (last_chat is not None and now - last_chat < self.per_chat_interval - TOLERANCE):
+            self.rate_limited += 1
+            raise RetryAfter(timedelta(seconds=self.retry_after))
+        if self.failures.get(chat_id):
+            self.failures[chat_id] -= 1
+            raise TimedOut()
+        self.delivered.append((now, chat_id, text))
+
+
+async def _deliver(notifier, bot, messages, timeout=5):
+    notifier.start(bot)
+    for chat_id, text in messages:
+        notifier.notify(chat_id, text)
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while notifier.stats()['queued'] and loop.time() < deadline:
+        await asyncio.sleep(0.01)
+    await notifier.stop()
+
+
+def _messages(chats, per_chat):
+    return [(chat_id, f'{chat_id}:{n}') for n in range(per_chat) for chat_id in chats]
+
+
+def test_pacing_respects_limits_and_order():
+    bot = RateLimitedBot(global_interval=0.02, per_chat_interval=0.05)
+    notifier = AdminNotifier([], global_rate=50, per_chat_interval=0.05)
+    messages = _messages([1, 2, 3], 5)
+
+    asyncio.run(_deliver(notifier, bot, messages))
+
+    assert bot.rate_limited == 0
+    assert notifier.stats() == {'queued': 0, 'sent': 15, 'failed': 0, 'dropped': 0}
+    for chat_id in (1, 2, 3):
+        texts = [text for _, c, text in bot.delivered if c == chat_id]
+        assert texts == [f'{chat_id}:{n}' for n in range(5)]
+    times = [t for t, _, _ in bot.delivered]
+    assert all(b - a >= 0.02 - TOLERANCE for a, b in zip(times, times[1:]))
+
+
+def test_retry_after_and_network_errors_are_retried_in_order():
+    # Бот строже, чем думает очередь: часть отправок получает RetryAfter
+    bot = RateLimitedBot(global_interval=0.02, per_chat_interval=0.1, retry_after=0.1, failures={2: 2})
+    notifier = AdminNotifier([], global_rate=50, per_chat_interval=0.05, base_backoff=0.01)
+    messages = _messages([1, 2], 4)
+
+    asyncio.run(_deliver(notifier, bot, messages))
+
+    assert bot.rate_limited > 0
+    assert notifier.stats()['sent'] == 8
+    assert notifier.stats()['failed'] == 0
+    assert bot.attempts == 8 + bot.rate_limited + 2
+    for chat_id in (1, 2):
+        delivered = [(t, text) for t, c, text in bot.delivered if c == chat_id]
+        assert [text for _, text in delivered] == [f'{chat_id}:{n}' for n in range(4)]
+        times = [t for t, _ in delivered]
+        assert all(b - a >= 0.1 - TOLERANCE for a, b in zip(times, times[1:]))
+
+
+def test_gives_up_after_max_retries():
+    bot = RateLimitedBot(global_interval=0, per_chat_interval=0, failures={1: 3})
+    notifier = AdminNotifier([], global_rate=1000, per_chat_interval=0.01, max_retries=3, base_backoff=0.01)
+
+    asyncio.run(_deliver(notifier, bot, [(1, 'lost'), (1, 'next')]))
+
+    # Первое сообщение отброшено после трёх попыток, следующее отправлено
+    assert bot.attempts == 4
+    assert [text for _, _, text in bot.delivered] == ['next']
+    assert notifier.stats()['failed'] == 1
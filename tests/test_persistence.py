@@ -0,0 +1,35 @@
+import asyncio
+
+from persistence import SQLitePersistence
+
+
+class FakeDatabase:
+    def __init__(self):
+        self.loads = 0
+
+    async def get_user_state(self, user_id):
+        self.loads += 1
+        return {'category': f'cat{user_id}'}
+
+
+def test_loaded_users_are_bounded():
+    db = FakeDatabase()
+    persistence = SQLitePersistence(db, max_users=2)
+
+    async def refresh(user_id):
+        user_data = {}
+        await persistence.refresh_user_data(user_id, user_data)
+        return user_data
+
+    async def scenario():
+        assert await refresh(1) == {'category': 'cat1'}
+        await refresh(1)
+        assert db.loads == 1
+        for user_id in range(2, 100):
+            await refresh(user_id)
+        assert len(persistence._loaded_users) == 2
+        # Вытесненный пользователь подгружается из базы заново
+        await refresh(1)
+        assert db.loads == 100
+
+    asyncio.run(scenario())
@@ -0,0 +1,18 @@
+from datetime import datetime, timedelta
+
+from scheduling import Scheduler, SlotIndex
+
+
+def test_offered_slot_expires():
+    now = datetime(2026, 10, 19, 9, 0)
+    clock = [now]
+    scheduler = Scheduler(SlotIndex(), lead=60, clock=lambda: clock[0])
+    scheduler.index.load([(1, 'Мастер')], [])
+
+    start, _ = scheduler.find_slots(30, limit=1)[0]
+    assert start == datetime(2026, 10, 19, 10, 0)
+    assert scheduler.is_bookable(start)
+
+    # Пользователь вернулся к предложенным кнопкам через несколько часов
+    clock[0] = now + timedelta(hours=3)
+    assert not scheduler.is_bookable(start)
@@ -0,0 +1,24 @@
+from dispatch import UpdateThrottle
+
+
+def test_bucket_refills_at_rate():
+    now = [0.0]
+    throttle = UpdateThrottle(rate=1.0, burst=3, clock=lambda: now[0])
+
+    assert [throttle.allow(1) for _ in range(4)] == [True, True, True, False]
+    now[0] += 1.0
+    assert throttle.allow(1)
+    assert not throttle.allow(1)
+    # Другой пользователь не затронут
+    assert throttle.allow(2)
+
+
+def test_buckets_are_bounded():
+    now = [0.0]
+    throttle = UpdateThrottle(rate=1.0, burst=1, max_users=10, clock=lambda: now[0])
+    for user_id in range(100):
+        throttle.allow(user_id)
+    assert len(throttle) == 10
+    # Недавние пользователи остались со своим состоянием, старые вытеснены
+    assert not throttle.allow(99)
+    assert throttle.allow(0)